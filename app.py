@@ -1,19 +1,21 @@
 import json
+import os
 import sys
 
 import numpy as np
 from PyQt5 import QtCore
 from PyQt5.QtWidgets import QApplication, QMainWindow, QPushButton, QLabel
 from PyQt5.QtGui import QPainter, QColor, QIcon, QCursor
-from PyQt5.QtCore import Qt, QPoint, QSize, QCoreApplication
+from PyQt5.QtCore import Qt, QPoint, QSize, QCoreApplication, QTimer
 
 from my_widgets import MyPushButton, ChangeableButton, MyVerticalSlider, MyHorizontalSlider, MyTextLabel, DurationLabel, \
     SearchBox, ExtensionIcon, ExitButton, VolumeControl, MyScrollArea, MyResultWidget, MyProgressBar, Player, \
-    CustomSwitch, LogoLabel, CameraWindow, MyContentLabel
+    CustomSwitch, LogoLabel, CameraWindow, MyContentLabel, PoseSearchThread
 
 import constants as c
+import instrumentation
 from cosine_distance import *
-from plot_utils import get_color
+from temporal_scoring import TemporalScorer
 
 
 # TODO: 菜单， 换肤中心， 分类， 开始前准备时间， 登录系统， 搜索课程， 导入与导出视频， 音乐健身, 收藏， 语音播报， 即时描述， 解析视频（拖拽）
@@ -34,6 +36,11 @@ class TransparentWindow(QMainWindow):
         self.duration_label = None
         self.volume_bar = None
         self.buttons = None
+        self.scorer = TemporalScorer()  # 与参考节目按时间对齐后打分，慢半拍不算错
+        self.pose_search = PoseSearchThread()  # 按姿势搜索在后台线程中更新索引、查询
+        self.pose_results_label = None
+        self.live_pose = None  # 摄像头最近一次识别到的骨骼向量
+        self.profile_label = None  # SMARTFIT_PROFILE=1 时显示各阶段耗时
 
         self.setWindowFlags(Qt.FramelessWindowHint | Qt.WindowStaysOnTopHint | Qt.Tool)
         self.setAttribute(Qt.WA_TranslucentBackground)
@@ -70,14 +77,18 @@ class TransparentWindow(QMainWindow):
         list_button = MyPushButton('', self, geometry=(self.width() - 50, self.height() - 36, 30, 30), icon="list",
                                    icon_size=(24, 18), tips="播放列表")
         # self.volume_bar = MyVerticalSlider(self, geometry=(self.width() - 72, self.height() - 106, 14, 75))
-        self.player = Player('videos/session1', self, fps=30, geometry=(50, 60, 700, 700))
+        self.player = Player('videos/session1', self, fps=30, geometry=(50, 60, 700, 700), use_opengl=os.environ.get('SMARTFIT_OPENGL') == '1')
         self.player.show()
 
         self.info_label = MyTextLabel(self, font_size=20)
         self.info_label.setGeometry(400, 800, 700, 45)
         self.info_label.show()
+        self.repetition_label = MyTextLabel(self, font_size=14)  # 上一遍节目的平均得分
+        self.repetition_label.setGeometry(400, 845, 700, 30)
+        self.repetition_label.show()
 
         self.camera_window.info.connect(self.info_label.update_text)
+        self.player.info.connect(self.info_label.update_text)
         self.camera_window.detections_updated.connect(self.calculate_similarity)
 
         rate_button = ChangeableButton('', self, geometry=(self.width() / 2 + 400, self.height() - 42, 50, 36), icons=('1.0x', '1.25x', '1.5x', '2.0x', '0.5x', '0.75x'), icon_size=(50, 36))
@@ -99,20 +110,29 @@ class TransparentWindow(QMainWindow):
 
         self.search_box = SearchBox(self, geometry=(15, 15, 280, 30))
         self.search_box.text_edit.returnPressed.connect(self.on_edit_finished)
+        pose_search_button = MyPushButton('按姿势搜索', self, geometry=(300, 15, 90, 30), slot=self.search_pose,
+                                          tips='用摄像头当前姿势（摄像头未识别到时用播放器当前帧）在节目库中查找')
+        self.pose_results_label = MyTextLabel(self, font_size=9)
+        self.pose_results_label.setGeometry(15, 770, 370, 110)
+        self.pose_results_label.setAlignment(Qt.AlignLeft | Qt.AlignTop)
+        self.pose_results_label.show()
+        self.pose_search.matches_found.connect(self.show_pose_matches)
 
         self.player.program_changed.connect(lambda: self.progress_bar.set_duration(self.player.duration()) or self.progress_bar.set_current(0))  # 换节目（节目当前帧归零）-》更新进度条（归零、更新总时长）
         self.progress_bar = MyProgressBar(self)
         self.progress_bar.set_duration(self.player.duration())  # 设置进度条初始时长
         self.progress_bar.move(int(self.width()/2-self.progress_bar.width()/2), self.height()-self.progress_bar.height()-20)
 
-        self.progress_bar.time_set.connect(lambda t: self.player.set_frame(int(t*self.player.fps)))  # 拖动进度条最后-》设置播放器的当前帧
+        self.progress_bar.time_set.connect(lambda t: self.player.set_frame(self.player.frame_at(t)))  # 拖动进度条最后-》设置播放器的当前帧
         self.progress_bar.slider.pressed.connect(self.player.timer.stop)  # 拖动时停止播放
         self.progress_bar.slider.released.connect(lambda: self.player.playing and self.player.start())  # and: 前真而后, or: 前假而后
-        self.progress_bar.slider.valueChanged.connect(lambda v: self.progress_bar.slider.pressing and self.player.update_frame(int(self.progress_bar.bar_time()*self.player.fps)))  #
+        self.progress_bar.slider.valueChanged.connect(lambda v: self.progress_bar.slider.pressing and self.player.update_frame(self.player.frame_at(self.progress_bar.bar_time())))  #
 
+        self.player.program_changed.connect(self.scorer.reset)  # 换节目后清空缓存的用户姿势
+        self.player.reach_end.connect(self.end_repetition)
         self.player.reach_end.connect(lambda: play_button.set_state(0) if not autoplay_switch.is_on else self.player.next() and self.player.start())  # 进度条触底-》按键样式变为暂停样式 or 下一个视频
 
-        self.player.sync_bar.connect(lambda f: self.progress_bar.set_current(f / self.player.fps))  # (在拖动时应断开此链接)
+        self.player.sync_bar.connect(self.progress_bar.set_current)  # (在拖动时应断开此链接)
 
         play_button.state_changed.connect(lambda i: self.player.start() if i == 1 else self.player.pause())  # 按键状态-》播放状态
 
@@ -123,31 +143,50 @@ class TransparentWindow(QMainWindow):
         # widgets2 = [MyContentLabel(None, name.lstrip(self.player.root).strip('.npy')) for name in self.player.playing_list]
         # session_scroller = MyScrollArea(self, widgets2, geometry=(24, self.height()-240, 240, 200))
 
+        if instrumentation.ENABLED:
+            self.profile_label = QLabel(self)
+            self.profile_label.setGeometry(15, 50, 260, 320)
+            self.profile_label.setAlignment(Qt.AlignLeft | Qt.AlignTop)
+            self.profile_label.setStyleSheet("color: rgb(0, 255, 0); font-family: Consolas, monospace; font-size: 11px;")
+            self.profile_label.show()
+            self.profile_timer = QTimer(self)
+            self.profile_timer.timeout.connect(self.update_profile_label)
+            self.profile_timer.start(500)
+
         self.buttons = [exit_button, play_button, previous_button, next_button, autoplay_switch, logo, list_button,
                         self.progress_bar, volume_control, rate_button, state_button, self.camera_button,
-                        self.search_box, program_scroller]
+                        self.search_box, pose_search_button, program_scroller]
+
+    def update_profile_label(self):
+        text = instrumentation.format_summary() + f'\n\nplayback {self.player.stats}'
+        if self.camera_window.inference_thread is not None:  # 摄像头打开时附上当前推理档位
+            text += '\n\n' + self.camera_window.inference_controller.describe().replace(', ', '\n')
+        self.profile_label.setText(text)
 
     def result_chosen(self, index):
         print(f"chose {index}") if self.player.load(index) else print(f'failed to load {self.player.playing_list[index]}')
 
+    def end_repetition(self):
+        score = self.scorer.end_repetition()
+        if score is not None:
+            self.repetition_label.update_text(f"第 {len(self.scorer.repetition_scores)} 遍：{score * 100:.2f}%")
+
     def calculate_similarity(self, results):
-        frame = self.player.get_frame()
+        arr_standard = self.player.get_bone_arrays()
         detected_bone_arrays = results['bone_arrays']
-        if frame is not None:
-            arr_standard = numpy_to_bone_arrays(frame)
-
-            M = kabsch(detected_bone_arrays, arr_standard)
-            detected_bone_arrays = np.dot(detected_bone_arrays, M)
-
-            result = np.sum(arr_standard*detected_bone_arrays, axis=1)
-            ys = interpolation_function(result)
-            colors = [get_color(y) for y in ys]
-            self.player.set_bone_color(colors)
+        self.live_pose = detected_bone_arrays
+        instrumentation.record_stamps(results['stamps'])
+        if arr_standard is not None:
+            result = self.scorer.align_and_score(detected_bone_arrays, self.player.bone_arrays, self.player.current_frame,
+                                                 self.player.detected)
+            if result is None:  # 参考节目这一段没有检测到人体
+                return
+            instrumentation.mark('end_to_end', results['stamps']['read'])  # Player 画出这一帧的颜色时结束
+            self.player.set_bone_color(result.colors)
             if not self.player.playing:
                 self.player.update_frame()
             if self.camera_window.detected:
-                score = np.mean(ys) * 100
-                self.info_label.update_text(f"{score:.2f}%")
+                self.info_label.update_text(f"{result.score * 100:.2f}%")
 
     def enterEvent(self, event):
         if not self.buttons:
@@ -156,10 +195,31 @@ class TransparentWindow(QMainWindow):
             button.show()
 
     def on_edit_finished(self):
-        print(self.search_box.text_edit.text())
+        text = self.search_box.text_edit.text()
+        print(text)
         self.search_box.text_edit.clear()
         self.showSearchResults = True
 
+    def search_pose(self, k=5):
+        """用摄像头当前姿势（摄像头未识别到时用播放器当前帧）在节目库中查找，结果由 show_pose_matches 显示"""
+        pose = self.live_pose if self.camera_window.detected and self.live_pose is not None else self.player.get_frame()
+        if pose is None:
+            return
+        if self.pose_search.search(self.player.root, np.array(pose), k):  # 复制一份，后台线程查询时不会被改动
+            self.pose_results_label.update_text("正在搜索……")
+
+    def show_pose_matches(self, matches):
+        """列出最相似的节目和时刻，并跳到第一个"""
+        lines = [f"{os.path.splitext(os.path.basename(match.path))[0]}  {match.timestamp_ms / 1000:.2f}s"
+                 f"（距离 {match.distance:.3f}）" for match in matches]
+        self.pose_results_label.update_text("\n".join(lines) or "没有找到相似的姿势")
+        names = [os.path.basename(p) for p in self.player.playing_list]
+        if matches and os.path.basename(matches[0].path) in names:
+            self.player.load(names.index(os.path.basename(matches[0].path)))
+            self.player.set_frame(matches[0].frame)
+            self.player.update_frame()
+            self.progress_bar.set_current(self.player.time_of(matches[0].frame))
+
     def leaveEvent(self, event):
         if self.buttons:
             for button in self.buttons:
@@ -183,10 +243,15 @@ class TransparentWindow(QMainWindow):
         self.draggable = True
 
     def closeEvent(self, event):
+        if self.player is not None:
+            self.player.shutdown()
+        self.pose_search.wait()
         QApplication.quit()
 
 
 if __name__ == '__main__':
+    if os.environ.get('SMARTFIT_SOFTWARE_GL') == '1':  # 无显卡环境（如 CI）使用软件 OpenGL
+        QCoreApplication.setAttribute(Qt.AA_UseSoftwareOpenGL)
     app = QApplication(sys.argv)
     window = TransparentWindow()
     window.show()
@@ -0,0 +1,33 @@
+"""kabsch（SVD）与 horn（四元数）两种对齐算法的一致性检查和耗时对比
+
+    python -m benchmarks.alignment
+"""
+import numpy as np
+
+from benchmarks.common import measure, report
+from benchmarks.kabsch import make_pairs
+from cosine_distance import alignment_backends
+
+TOLERANCE = 1e-8
+
+
+if __name__ == '__main__':
+    P, Q = make_pairs(1024, noise=0.05)
+    R_ref, rmsd_ref = alignment_backends['kabsch'][1](P, Q)
+    for name, (single, batch) in alignment_backends.items():
+        R_single = np.array([single(p, q) for p, q in zip(P, Q)])
+        R_batch, rmsd = batch(P, Q)
+        err = max(np.abs(R_single - R_ref).max(), np.abs(R_batch - R_ref).max(), np.abs(rmsd - rmsd_ref).max())
+        assert err < TOLERANCE, f'{name} 与 kabsch 的偏差 {err:.2e} 超出容差'
+        print(f"{name}: max deviation from kabsch {err:.2e}")
+
+    print("per-frame latency (35 bone vectors)")
+    p, q = P[0], Q[0]
+    latency = {name: measure(single, p, q, number=2000) for name, (single, _) in alignment_backends.items()}
+    for name, t in latency.items():
+        report(f'  {name}', t)
+    print(f"  horn gain {(latency['kabsch'] - latency['horn']) * 1e6:.1f} us/frame (x{latency['kabsch'] / latency['horn']:.2f})")
+
+    print(f"batch of {len(P)}")
+    for name, (_, batch) in alignment_backends.items():
+        report(f'  {name}_batch', measure(batch, P, Q, number=10), len(P), 'pair')
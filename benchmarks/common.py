@@ -0,0 +1,36 @@
+import time
+
+import numpy as np
+
+
+def measure(func, *args, repeat=5, number=100, per_repeat=False):
+    """返回 func(*args) 单次调用的最短耗时（秒），取 repeat 组中最快的一组
+
+    per_repeat 为 True 时返回每一组的单次调用耗时列表，用于估计噪声
+    """
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        for _ in range(number):
+            func(*args)
+        times.append((time.perf_counter() - t0) / number)
+    return times if per_repeat else min(times)
+
+
+def random_rotations(n, rng):
+    """n 个均匀分布的随机旋转矩阵"""
+    q = rng.normal(size=(n, 4))
+    q /= np.linalg.norm(q, axis=1, keepdims=True)
+    w, x, y, z = q.T
+    return np.stack([
+        np.stack([1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)], axis=-1),
+        np.stack([2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)], axis=-1),
+        np.stack([2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)], axis=-1),
+    ], axis=1)
+
+
+def report(name, seconds, per=None, unit='item'):
+    text = f"{name:<40s}{seconds * 1e6:>12.1f} us"
+    if per:
+        text += f"  ({seconds / per * 1e6:.2f} us/{unit})"
+    print(text)
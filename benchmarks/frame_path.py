@@ -0,0 +1,145 @@
+"""摄像头帧从采集到显示的内存分配和耗时
+
+    QT_QPA_PLATFORM=offscreen python -m benchmarks.frame_path
+
+对比原来的路径（每帧 read 新数组、flip 和 cvtColor 各分配一次、QImage.copy、QPixmap.fromImage）
+和缓冲池的路径（读进 FramePool 的空闲缓冲区、原地翻转、cvtColor 直接写进 ImageRing 的 QImage）。
+分配量用 tracemalloc 统计 numpy 缓冲区；QImage/QPixmap 的分配不经过 Python，只体现在耗时上。
+另外用 30 fps 的假摄像头和每帧 120 ms 的慢消费者运行 CaptureThread，检查处理中的帧不会被采集线程覆盖。
+"""
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+from PyQt5.QtGui import QGuiApplication, QImage, QPixmap
+
+from benchmarks.common import measure, report
+from camera_pipeline import CaptureThread, FramePool, FrameQueue, ImageRing
+
+WIDTH, HEIGHT = 640, 480
+FRAMES = 200
+
+
+class FakeCamera:
+    """与 cv2.VideoCapture.read 接口相同，轮流返回几帧随机图像"""
+
+    def __init__(self, rng, count=4):
+        self.frames = rng.integers(0, 256, size=(count, HEIGHT, WIDTH, 3), dtype=np.uint8)
+        self.index = 0
+
+    def read(self, image=None):
+        frame = self.frames[self.index % len(self.frames)]
+        self.index += 1
+        if image is None:
+            return True, frame.copy()
+        np.copyto(image, frame)
+        return True, image
+
+
+def old_path(camera):
+    _, frame = camera.read()
+    frame = cv2.flip(frame, 1)
+    frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
+    qimage = QImage(frame.data, frame.shape[1], frame.shape[0], frame.strides[0], QImage.Format_RGB888).copy()
+    return QPixmap.fromImage(qimage)
+
+
+class PooledPath:
+    def __init__(self, camera):
+        self.camera = camera
+        self.capture_pool = FramePool(3)
+        self.display_images = ImageRing(3)
+        self.shape = (HEIGHT, WIDTH, 3)
+
+    def __call__(self):
+        _, frame = self.camera.read(image=self.capture_pool.acquire(self.shape))
+        frame = cv2.flip(frame, 1, dst=frame)
+        image, rgb = self.display_images.next(frame.shape[1], frame.shape[0])
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=rgb)
+        self.capture_pool.release(frame)
+        return image
+
+
+class CountingSource:
+    """30 fps 的帧源，第 i 帧的像素全为 i % 256"""
+
+    def __init__(self, frames=40, fps=30.):
+        self.frames = frames
+        self.fps = fps
+        self.index = 0
+        self.timestamp = None
+
+    def isOpened(self):
+        return self.index < self.frames
+
+    def wait(self):
+        time.sleep(1 / self.fps)
+
+    def read(self, image=None):
+        if image is None:
+            image = np.empty((HEIGHT, WIDTH, 3), np.uint8)
+        image.fill(self.index % 256)
+        self.timestamp = self.index / self.fps
+        self.index += 1
+        return True, image
+
+
+def overwritten_frames(processing=0.12):
+    """慢消费者处理期间被改写的帧数 / 处理的帧数"""
+    frame_queue = FrameQueue(maxsize=1)
+    capture = CaptureThread(CountingSource(), frame_queue)
+    processed = overwritten = 0
+    capture.start()
+    while capture.isRunning() or frame_queue._queue.qsize():
+        item = frame_queue.get(timeout=0.1)
+        if item is None or not hasattr(item, 'frame'):
+            continue
+        value = item.frame[0, 0, 0]
+        time.sleep(processing)
+        processed += 1
+        overwritten += not np.all(item.frame == value)
+        frame_queue.release(item)
+    capture.wait()
+    return overwritten, processed
+
+
+def allocated_per_frame(func, *args):
+    func(*args)  # 预热，缓冲区在第一帧分配
+    tracemalloc.start()
+    tracemalloc.reset_peak()
+    before, _ = tracemalloc.get_traced_memory()
+    total = 0
+    for _ in range(FRAMES):
+        snapshot, _ = tracemalloc.get_traced_memory()
+        result = func(*args)
+        _, peak = tracemalloc.get_traced_memory()
+        total += peak - snapshot
+        tracemalloc.reset_peak()
+        del result
+    tracemalloc.stop()
+    return total / FRAMES
+
+
+if __name__ == '__main__':
+    app = QGuiApplication(sys.argv)
+    rng = np.random.default_rng(0)
+    camera = FakeCamera(rng)
+    pooled = PooledPath(camera)
+
+    # 两条路径的结果必须一致
+    camera.index = 0
+    expected = old_path(camera).toImage().convertToFormat(QImage.Format_RGB888)
+    camera.index = 0
+    actual = pooled()
+    assert expected.constBits().asstring(expected.sizeInBytes()) == actual.constBits().asstring(actual.sizeInBytes())
+
+    overwritten, processed = overwritten_frames()
+    assert not overwritten, f'{overwritten}/{processed} frames were overwritten while being processed'
+    print(f'slow consumer: 0/{processed} frames overwritten while being processed')
+
+    print(f'{WIDTH}x{HEIGHT}, frame {WIDTH * HEIGHT * 3 / 1024:.0f} KiB')
+    for name, func, args in [('copy per stage', old_path, (camera,)), ('frame pool', pooled, ())]:
+        report(name, measure(func, *args, repeat=5, number=50))
+        print(f'{"":<40s}{allocated_per_frame(func, *args) / 1024:>12.1f} KiB/frame')
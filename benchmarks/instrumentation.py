@@ -0,0 +1,37 @@
+"""埋点本身的开销
+
+    python -m benchmarks.instrumentation
+
+关闭时 span() 返回共享的空上下文管理器，打开时每次记录一条（加锁写环形缓冲区）。
+"""
+import time
+
+import instrumentation
+from benchmarks.common import measure, report
+
+STAMPS = {'read': 0., 'captured': 1e-4, 'dequeued': 2e-4, 'inferred': 3e-3, 'emitted': 3.2e-3}
+
+
+def empty():
+    pass
+
+
+def with_span():
+    with instrumentation.span('scoring'):
+        pass
+
+
+def with_record():
+    instrumentation.record('scoring', time.perf_counter())
+
+
+if __name__ == '__main__':
+    report('empty call', measure(empty, number=100000))
+    for state in ('disabled', 'enabled'):
+        if state == 'enabled':
+            instrumentation.enable()
+        report(f'span, {state}', measure(with_span, number=100000))
+        report(f'record, {state}', measure(with_record, number=100000))
+        report(f'record_stamps, {state}', measure(instrumentation.record_stamps, STAMPS, number=100000))
+    instrumentation.timeline.summary()
+    report('summary (4096 spans)', measure(instrumentation.timeline.summary, number=100))
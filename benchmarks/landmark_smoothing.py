@@ -0,0 +1,55 @@
+"""LandmarkFilter 的平滑效果和单帧耗时
+
+    python -m benchmarks.landmark_smoothing
+
+参考节目先做一次非因果的高斯平滑作为“真实”轨迹，再加上高斯噪声模拟检测抖动。
+"""
+import numpy as np
+
+from benchmarks.common import measure, report
+from landmark_filter import LandmarkFilter
+
+SESSION = 'videos/session1/1-side step+clap.npy'
+FPS = 30.
+NOISE = 0.005
+
+
+def jitter(poses):
+    """二阶差分的平均幅度，越小越平稳"""
+    return np.abs(np.diff(poses, 2, axis=0)).mean()
+
+
+def run(landmark_filter, poses, visibility):
+    return np.array([landmark_filter.update(p, v, i / FPS)[0].copy() for i, (p, v) in enumerate(zip(poses, visibility))])
+
+
+if __name__ == '__main__':
+    landmarks = np.load(SESSION)
+    kernel = np.exp(-0.5 * (np.arange(-6, 7) / 2) ** 2)
+    kernel /= kernel.sum()
+    truth = np.apply_along_axis(lambda a: np.convolve(np.pad(a, 6, mode='edge'), kernel, 'valid'), 0, landmarks)
+    rng = np.random.default_rng(0)
+    noisy = truth + rng.normal(scale=NOISE, size=truth.shape)
+    visibility = np.ones(truth.shape[:2])
+
+    filtered = run(LandmarkFilter(), noisy, visibility)
+    rms = lambda poses: np.sqrt(np.mean((poses - truth) ** 2))
+    print(f"jitter: truth {jitter(truth):.4f}, raw {jitter(noisy):.4f}, filtered {jitter(filtered):.4f}")
+    print(f"rms error: raw {rms(noisy):.4f}, filtered {rms(filtered):.4f}")
+    assert jitter(filtered) < jitter(noisy), 'filter does not reduce jitter'
+    assert rms(filtered) <= rms(noisy), 'filter lags behind the true trajectory more than the noise it removes'
+
+    # 离群值：一帧中手腕跳到画面另一侧
+    spiked = noisy.copy()
+    spiked[200, 15] += 0.5
+    filtered = run(LandmarkFilter(), spiked, visibility)
+    print(f"wrist error on a 0.5 spike frame: {np.linalg.norm(filtered[200, 15] - truth[200, 15]):.4f}")
+
+    landmark_filter = LandmarkFilter()
+    state = {'t': 0.}
+
+    def step():
+        state['t'] += 1 / FPS
+        landmark_filter.update(noisy[100], visibility[100], state['t'])
+
+    report('LandmarkFilter.update', measure(step, number=2000))
@@ -0,0 +1,57 @@
+"""模拟播放：定时器每跳一次前进一帧（原实现）与按单调时钟选帧的播放位置误差对比
+
+    python -m benchmarks.playback
+
+用虚拟时钟模拟，每次刷新（绘制 + 打分）耗时 work_ms，定时器间隔按 Qt 的整数毫秒取整。
+"""
+import numpy as np
+
+from playback_clock import PlaybackClock, PlaybackStats
+from pose_io import frame_at
+
+FPS = 30.
+SECONDS = 10.
+
+
+class VirtualClock:
+    def __init__(self):
+        self.now = 0.
+
+    def __call__(self):
+        return self.now
+
+
+def simulate(rate, work_ms, frames):
+    timestamps = np.arange(frames) * (1000. / FPS)
+    interval = int(1000 / (FPS * rate))
+    wall = VirtualClock()
+
+    # 原实现：每次超时显示下一帧，超时要等上一次刷新结束
+    t, i = 0., 0
+    while i < frames and t < SECONDS:
+        t += max(interval, work_ms) / 1000
+        i += 1
+    legacy_error = timestamps[min(i, frames - 1)] - SECONDS * 1000 * rate
+
+    clock, stats = PlaybackClock(clock=wall), PlaybackStats(clock=wall)
+    clock.set_rate(rate)
+    clock.start(0.)
+    current = 0
+    while wall.now < SECONDS:
+        wall.now += max(interval, work_ms) / 1000
+        j = frame_at(timestamps, clock.position())
+        if j != current:
+            stats.record(dropped=max(j - current - 1, 0))
+            current = j
+    clock_error = timestamps[current] - SECONDS * 1000 * rate
+    return legacy_error, clock_error, stats
+
+
+if __name__ == '__main__':
+    frames = int(FPS * SECONDS * 3)
+    print(f"position error after {SECONDS:.0f} s of playback (ms, negative = behind)")
+    print(f"{'rate':>6s}{'work ms':>9s}{'tick/frame':>13s}{'clock':>9s}  clock stats")
+    for rate in (0.5, 1.0, 1.25, 1.5, 2.0):
+        for work_ms in (5, 50):
+            legacy_error, clock_error, stats = simulate(rate, work_ms, frames)
+            print(f"{rate:>6.2f}{work_ms:>9d}{legacy_error:>13.0f}{clock_error:>9.0f}  {stats}")
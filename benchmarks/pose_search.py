@@ -0,0 +1,52 @@
+"""PoseIndex 与逐帧暴力比较的一致性检查和查询耗时
+
+    python -m benchmarks.pose_search
+
+在临时目录里用参考节目加噪声、随机旋转生成 COPIES 个节目作为节目库。
+"""
+import os
+import tempfile
+import time
+
+import numpy as np
+
+import quaternion
+from benchmarks.common import measure, report
+from pose_index import PoseIndex, pose_features
+from detect_utils import poses_to_bone_arrays
+
+SESSION = 'videos/session1/1-side step+clap.npy'
+COPIES = 40
+
+
+def brute_force(features, query):
+    return np.argsort(np.linalg.norm(features - query, axis=1))
+
+
+if __name__ == '__main__':
+    rng = np.random.default_rng(0)
+    landmarks = np.load(SESSION)
+    with tempfile.TemporaryDirectory() as root:
+        for i in range(COPIES):
+            noisy = landmarks + rng.normal(scale=0.005, size=landmarks.shape)
+            np.save(os.path.join(root, f'{i + 1}-copy.npy'), quaternion.rotate_session(noisy, quaternion.normalize(rng.normal(size=4))))
+        index = PoseIndex(root)
+        t0 = time.perf_counter()
+        index.update()
+        print(f"indexed {len(index)} frames of {COPIES} sessions in {time.perf_counter() - t0:.2f} s")
+
+        np.save(os.path.join(root, f'{COPIES + 1}-copy.npy'), landmarks)
+        t0 = time.perf_counter()
+        index.update()
+        print(f"added one session in {time.perf_counter() - t0:.3f} s")
+
+        pose = quaternion.rotate_session(landmarks[300:301], quaternion.normalize(rng.normal(size=4)))[0]
+        query = pose_features(poses_to_bone_arrays(pose[None])[0][0])
+        nearest = brute_force(index.features, query)[0]
+        matches = index.query(pose, k=5)
+        assert matches[0].distance <= np.linalg.norm(index.features[nearest] - query) + 1e-5
+        print(f"best match {os.path.basename(matches[0].path)} frame {matches[0].frame} (query was frame 300 of "
+              f"{COPIES + 1}-copy.npy, rotated), distance {matches[0].distance:.4f}")
+
+        report('  brute force', measure(brute_force, index.features, query, number=20))
+        report('  PoseIndex.query (top-5 sessions)', measure(index.query, pose, 5, number=20))
@@ -0,0 +1,49 @@
+"""draw_skeleton + pil_image_to_qpixmap 与 SkeletonRenderer 的单帧绘制耗时对比
+
+    python -m benchmarks.render
+"""
+import os
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import numpy as np
+from PyQt5.QtGui import QGuiApplication, QImage
+
+from benchmarks.common import measure, report
+from plot_utils import SkeletonRenderer, draw_skeleton, get_color, pil_image_to_qpixmap
+
+SESSION = 'videos/session1/1-side step+clap.npy'
+
+
+def qimage_to_numpy(image):
+    image = image.convertToFormat(QImage.Format_RGBA8888)
+    buffer = image.constBits()
+    buffer.setsize(image.byteCount())
+    return np.frombuffer(buffer, np.uint8).reshape(image.height(), image.width(), 4).copy()
+
+
+def old_path(keypoints, normal_vector, bone_color):
+    return pil_image_to_qpixmap(draw_skeleton(keypoints, normal_vector, bone_color=bone_color))
+
+
+if __name__ == '__main__':
+    app = QGuiApplication([])
+    keypoints = np.load(SESSION)[100]
+    normal_vector = np.array([0.1, 0.2, 1.0])
+    bone_color = [get_color(y) for y in np.linspace(0, 1, 35)]
+    renderer = SkeletonRenderer()
+
+    for name, colors in (('white bones', None), ('recolored bones', bone_color)):
+        old = np.array(draw_skeleton(keypoints, normal_vector, bone_color=colors).convert('RGBA'))
+        new = qimage_to_numpy(renderer.render(keypoints, normal_vector, colors))
+        covered = ((old[..., 3] > 0) | (new[..., 3] > 0)).sum()
+        differ = (np.abs(old.astype(int) - new).max(axis=-1) > 0).sum()
+        print(f"{name}: {differ}/{covered} drawn pixels differ (rasterization)")
+        t_old = measure(old_path, keypoints, normal_vector, colors, number=200)
+        t_new = measure(renderer.render, keypoints, normal_vector, colors, number=200)
+        report('  draw_skeleton + pil_image_to_qpixmap', t_old)
+        report('  SkeletonRenderer.render', t_new)
+        renderer.set_view(normal_vector)
+        t_cached = measure(lambda: renderer.render(keypoints, bone_color=colors), number=200)
+        report('  SkeletonRenderer.render (cached view)', t_cached)
+        print(f"  speedup x{t_old / t_new:.1f}")
@@ -0,0 +1,56 @@
+"""递归 dfs 的 transform 与逐层向量化的 retarget 的一致性检查和耗时对比
+
+    python -m benchmarks.retarget
+"""
+import numpy as np
+
+from benchmarks.common import measure, report
+from detect_utils import neighbours, poses_to_bone_arrays, retarget, retarget_bone
+
+SESSION = 'videos/session1/1-side step+clap.npy'
+TOLERANCE = 1e-12
+
+
+def transform_dfs(arr, arr2, multiple=1):
+    """原来的实现"""
+    visited = np.zeros(33, dtype=bool)
+    arr1 = arr.copy()
+
+    def dfs(i):
+        visited[i] = True
+        for idx in neighbours[i]:
+            arr1[idx] = arr1[i] + (arr2[idx] - arr2[i]) * multiple
+            if not visited[idx]:
+                dfs(idx)
+    for base in [12, 11, 24, 23]:
+        dfs(base)
+    return arr1
+
+
+def transform_loop(poses, reference, multiple=1):
+    return np.array([transform_dfs(p, r, multiple) for p, r in zip(poses, reference)])
+
+
+if __name__ == '__main__':
+    poses = np.load(SESSION)
+    reference = np.roll(poses, 100, axis=0)
+    for multiple in (1, 1.5):
+        err = np.abs(transform_loop(poses, reference, multiple) - retarget(poses, reference, multiple)).max()
+        assert err < TOLERANCE, f'retarget 与 dfs 的偏差 {err:.2e} 超出容差'
+        print(f'multiple={multiple}: max deviation from dfs {err:.2e}')
+
+    # 保留用户骨骼长度：遍历树上的骨骼方向与参考相同，长度与用户相同
+    units, lengths = poses_to_bone_arrays(poses)
+    kept_units, kept_lengths = poses_to_bone_arrays(retarget(poses, reference, preserve_lengths=True, bone_lengths=lengths))
+    ref_units = poses_to_bone_arrays(reference)[0]
+    tree = retarget_bone[retarget_bone >= 0]
+    err = max(np.abs(kept_lengths - lengths)[:, tree].max(), np.abs(kept_units - ref_units)[:, tree].max())
+    assert err < 1e-9, f'preserve_lengths 的偏差 {err:.2e} 超出容差'
+    print(f'preserve_lengths: max deviation of lengths/directions {err:.2e}')
+
+    print('single pose')
+    report('  transform (dfs)', measure(transform_dfs, poses[0], reference[0], number=500))
+    report('  retarget', measure(retarget, poses[0], reference[0], number=500))
+    print(f'session of {len(poses)} frames')
+    report('  transform (dfs) per frame', measure(transform_loop, poses, reference, number=3), len(poses), 'frame')
+    report('  retarget', measure(retarget, poses, reference, number=50), len(poses), 'frame')
@@ -0,0 +1,85 @@
+"""quaternion.py 与原 test.py 中逐元素四元数函数的一致性检查和耗时对比
+
+    python -m benchmarks.rotation
+"""
+import numpy as np
+
+import quaternion
+from benchmarks.common import measure, report
+
+SESSION = 'videos/session1/1-side step+clap.npy'
+TOLERANCE = 1e-12
+
+
+def legacy_from_axis_angle(axis, angle):
+    half_angle = angle / 2
+    sin_half_angle = np.sin(half_angle)
+    return np.array([np.cos(half_angle)] + [sin_half_angle * a for a in axis])
+
+
+def legacy_multiply(q1, q2):
+    w1, x1, y1, z1 = q1
+    w2, x2, y2, z2 = q2
+    return np.array([
+        w1 * w2 - x1 * x2 - y1 * y2 - z1 * z2,
+        w1 * x2 + x1 * w2 + y1 * z2 - z1 * y2,
+        w1 * y2 + y1 * w2 + z1 * x2 - x1 * z2,
+        w1 * z2 + z1 * w2 + x1 * y2 - y1 * x2,
+    ])
+
+
+def legacy_rotate_vector(q, v):
+    qv = np.array([0] + v.tolist())
+    q_conj = np.array([q[0], -q[1], -q[2], -q[3]])
+    return legacy_multiply(legacy_multiply(q, qv), q_conj)[1:]
+
+
+def legacy_drag(q, dx, dy):
+    """Player.mouseMoveEvent 原来每个鼠标事件的计算"""
+    q = legacy_multiply(q, legacy_from_axis_angle(np.array([0, 1, 0]), np.deg2rad(dx * 0.5)))
+    q = legacy_multiply(q, legacy_from_axis_angle(np.array([1, 0, 0]), np.deg2rad(dy * 0.5)))
+    return q, legacy_rotate_vector(q, np.array([0, 0, 1]))
+
+
+def drag(orientation, dx, dy):
+    orientation.rotate(np.array([0., 1., 0.]), np.deg2rad(dx * 0.5))
+    orientation.rotate(np.array([1., 0., 0.]), np.deg2rad(dy * 0.5))
+    return orientation.apply(np.array([0., 0., 1.]))
+
+
+if __name__ == '__main__':
+    rng = np.random.default_rng(0)
+    q = quaternion.normalize(rng.normal(size=(256, 4)))
+    r = quaternion.normalize(rng.normal(size=(256, 4)))
+    v = rng.normal(size=(256, 3))
+    err = max(
+        np.abs(quaternion.multiply(q, r) - [legacy_multiply(a, b) for a, b in zip(q, r)]).max(),
+        np.abs(quaternion.rotate_vector(q, v) - [legacy_rotate_vector(a, b) for a, b in zip(q, v)]).max(),
+        np.abs(np.array([quaternion.rotate_vector(a, b) for a, b in zip(q, v)]) - quaternion.rotate_vector(q, v)).max(),
+    )
+    assert err < TOLERANCE, f'与原实现的偏差 {err:.2e} 超出容差'
+    print(f"max deviation from legacy helpers {err:.2e}")
+
+    steps = rng.integers(-20, 21, size=(100000, 2))
+    orientation, q_legacy = quaternion.Orientation(), np.array([1., 0., 0., 0.])
+    for dx, dy in steps:
+        drag(orientation, dx, dy)
+        q_legacy, _ = legacy_drag(q_legacy, dx, dy)
+    print(f"|q| - 1 after {len(steps)} drag events: legacy {np.linalg.norm(q_legacy) - 1:.1e}, "
+          f"Orientation {np.linalg.norm(orientation.q) - 1:.1e}")
+
+    print("one drag event (yaw + pitch + view normal)")
+    report('  legacy helpers', measure(legacy_drag, q_legacy, 3, -2, number=2000))
+    report('  Orientation', measure(drag, orientation, 3, -2, number=2000))
+
+    landmarks = np.load(SESSION)
+    out = np.empty_like(landmarks)
+    q_session = quaternion.normalize(rng.normal(size=4))
+    expected = np.array([[legacy_rotate_vector(q_session, p) for p in frame] for frame in landmarks[:20]])
+    assert np.abs(quaternion.rotate_session(landmarks, q_session, out=out)[:20] - expected).max() < TOLERANCE
+    print(f"rotate whole session {landmarks.shape}")
+    report('  legacy per point (20 frames)', measure(
+        lambda: [[legacy_rotate_vector(q_session, p) for p in frame] for frame in landmarks[:20]], number=3),
+        20, 'frame')
+    report('  rotate_session', measure(quaternion.rotate_session, landmarks, q_session, out, number=50),
+           len(landmarks), 'frame')
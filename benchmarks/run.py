@@ -0,0 +1,298 @@
+"""基准测试套件：各条热路径的耗时，与保存的基线比较
+
+    python -m benchmarks.run                  # 全部运行，与 benchmarks/baseline.json 比较
+    python -m benchmarks.run --save           # 把本次结果保存为基线
+    python -m benchmarks.run -k render -k kabsch --threshold 0.1
+
+不需要摄像头和显示器（Qt 使用 offscreen 平台）。输入为录制的节目（SESSION）和固定种子生成的合成姿势，
+大文件用例把录制的节目平铺成 --large-frames 帧写到临时目录。
+每个用例先校准调用次数，使每组至少运行 --min-time 秒，取 repeat 组中最快的一组；组间的离散程度（中位数比最快慢多少）记为噪声。
+按每帧（或每对）的耗时与基线比较，输入规模不同的用例不比较。比基线慢 threshold 以上、
+且超出两次运行噪声之和 NOISE_FACTOR 倍的标记为 REGRESSION，此时退出码为 1。基线与机器有关，不纳入版本管理。
+新用例用 @case 注册：setup(inputs) 返回 (无参函数, 每次调用处理的帧（或姿势对）数，没有则为 None)。
+"""
+import argparse
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+from functools import cached_property
+from types import SimpleNamespace
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import numpy as np
+
+from benchmarks.common import measure
+from benchmarks.kabsch import make_pairs
+
+SESSION = 'videos/session1/1-side step+clap.npy'
+BASELINE = os.path.join(os.path.dirname(__file__), 'baseline.json')
+NOISE_FACTOR = 3
+
+CASES = {}
+
+
+def case(name, repeat=7):
+    def register(setup):
+        CASES[name] = (setup, repeat)
+        return setup
+    return register
+
+
+class Inputs:
+    """用例共享的输入，用到时才生成"""
+
+    def __init__(self, large_frames=100_000, seed=0):
+        self.large_frames = large_frames
+        self.seed = seed
+        self.tmpdir = None
+
+    @cached_property
+    def recorded(self):
+        """录制的节目 (N, 33, 3)，不存在时用合成姿势代替"""
+        if os.path.exists(SESSION):
+            return np.load(SESSION)
+        return self.synthetic
+
+    @cached_property
+    def synthetic(self):
+        """围绕一个随机姿势做小幅随机游走的 600 帧"""
+        rng = np.random.default_rng(self.seed)
+        base = rng.uniform(0.3, 0.7, size=(33, 3))
+        return base + np.cumsum(rng.normal(scale=0.005, size=(600, 33, 3)), axis=0)
+
+    @cached_property
+    def large_session(self):
+        self.tmpdir = tempfile.mkdtemp(prefix='smartfit-bench-')
+        path = os.path.join(self.tmpdir, '1-large.npy')
+        repeats = -(-self.large_frames // len(self.recorded))
+        np.save(path, np.tile(self.recorded, (repeats, 1, 1))[:self.large_frames])
+        return path
+
+    @cached_property
+    def qt_app(self):
+        from PyQt5.QtGui import QGuiApplication
+        return QGuiApplication.instance() or QGuiApplication([])
+
+    def cleanup(self):
+        if self.tmpdir is not None:
+            shutil.rmtree(self.tmpdir, ignore_errors=True)
+
+
+@case('bones/landmarks_to_bone_arrays')
+def _(inputs):
+    from cosine_distance import landmarks_to_bone_arrays
+    # 与 mediapipe 的 pose_landmarks 相同的属性访问方式
+    landmarks = SimpleNamespace(landmark=[SimpleNamespace(x=x, y=y, z=z, visibility=1.) for x, y, z in inputs.synthetic[0]])
+    return lambda: landmarks_to_bone_arrays(landmarks), None
+
+
+@case('bones/numpy_to_bone_arrays')
+def _(inputs):
+    from cosine_distance import numpy_to_bone_arrays
+    pose = inputs.recorded[100]
+    return lambda: numpy_to_bone_arrays(pose), None
+
+
+@case('bones/poses_to_bone_arrays session')
+def _(inputs):
+    from detect_utils import poses_to_bone_arrays
+    poses = inputs.recorded
+    return lambda: poses_to_bone_arrays(poses), len(poses)
+
+
+@case('align/kabsch')
+def _(inputs):
+    from cosine_distance import kabsch
+    P, Q = make_pairs(1, seed=inputs.seed)
+    return lambda: kabsch(P[0], Q[0]), None
+
+
+@case('align/kabsch_batch 1024')
+def _(inputs):
+    from cosine_distance import kabsch_batch
+    P, Q = make_pairs(1024, seed=inputs.seed)
+    return lambda: kabsch_batch(P, Q), len(P)
+
+
+@case('retarget/transform')
+def _(inputs):
+    from detect_utils import transform
+    user, reference = inputs.recorded[100], inputs.recorded[200]
+    return lambda: transform(user, reference), None
+
+
+@case('retarget/retarget session')
+def _(inputs):
+    from detect_utils import retarget
+    poses = inputs.recorded
+    reference = np.roll(poses, 100, axis=0)
+    return lambda: retarget(poses, reference), len(poses)
+
+
+@case('scoring/interpolation + get_color')
+def _(inputs):
+    from cosine_distance import interpolation_function, numpy_to_bone_arrays
+    from plot_utils import get_color
+    cosines = np.einsum('ij,ij->i', numpy_to_bone_arrays(inputs.recorded[100]), numpy_to_bone_arrays(inputs.recorded[200]))
+    return lambda: [get_color(y) for y in interpolation_function(cosines)], None
+
+
+@case('scoring/ScoreCurve.score_pose')
+def _(inputs):
+    from cosine_distance import numpy_to_bone_arrays
+    from scoring import score_pose
+    user, reference = numpy_to_bone_arrays(inputs.recorded[100]), numpy_to_bone_arrays(inputs.recorded[200])
+    return lambda: score_pose(user, reference), None
+
+
+@case('render/draw_skeleton + pil_image_to_qpixmap')
+def _(inputs):
+    from plot_utils import draw_skeleton, get_color, pil_image_to_qpixmap
+    inputs.qt_app
+    keypoints, colors = inputs.recorded[100], [get_color(y) for y in np.linspace(0, 1, 35)]
+    return lambda: pil_image_to_qpixmap(draw_skeleton(keypoints, (0.1, 0.2, 1.0), bone_color=colors)), None
+
+
+@case('render/SkeletonRenderer.render')
+def _(inputs):
+    from plot_utils import SkeletonRenderer
+    from scoring import DEFAULT_CURVE
+    inputs.qt_app
+    renderer = SkeletonRenderer()
+    renderer.set_view(np.array([0.1, 0.2, 1.0]))
+    keypoints, colors = inputs.recorded[100], DEFAULT_CURVE.colors(np.linspace(-1, 1, 35))
+    return lambda: renderer.render(keypoints, bone_color=colors), None
+
+
+@case('load/open_session large')
+def _(inputs):
+    # Player.load 中读数据的部分（经 SessionLibrary/Prefetcher 调用），骨骼向量缓存已存在
+    from session_library import open_session
+    path = inputs.large_session
+    open_session(path)
+    return lambda: open_session(path, warm_frames=30), inputs.large_frames
+
+
+@case('load/open_session large, first open', repeat=3)
+def _(inputs):
+    # 第一次打开：分块计算并写入骨骼向量缓存
+    from detect_utils import bone_cache_path
+    from session_library import open_session
+    path = inputs.large_session
+
+    def first_open():
+        if os.path.exists(bone_cache_path(path)):
+            os.remove(bone_cache_path(path))
+        open_session(path, warm_frames=30)
+    return first_open, inputs.large_frames
+
+
+def machine():
+    return {'machine': platform.machine(), 'processor': platform.processor(), 'system': platform.system(),
+            'python': platform.python_version(), 'numpy': np.__version__}
+
+
+def calibrate(func, min_time):
+    """每组调用多少次才能运行至少 min_time 秒"""
+    number = 1
+    while True:
+        elapsed = measure(func, repeat=1, number=number) * number
+        if elapsed >= min_time:
+            return number
+        number = max(number * 2, int(number * min_time / max(elapsed, 1e-9) * 1.2))
+
+
+def run(names, inputs, min_time):
+    results = {}
+    for name in names:
+        setup, repeat = CASES[name]
+        func, per = setup(inputs)
+        t = measure(func, repeat=repeat, number=calibrate(func, min_time), per_repeat=True)
+        best = min(t)
+        results[name] = {'seconds': best, 'per': per, 'noise': float(np.median(t) / best - 1)}
+    return results
+
+
+def per_item(result):
+    return result['seconds'] / (result['per'] or 1)
+
+
+def compare(results, baseline, threshold):
+    """打印结果，返回退步的用例名"""
+    regressions = []
+    print(f'{"case":<46s}{"per item":>12s}{"noise":>8s}{"baseline":>12s}{"change":>9s}')
+    for name, result in results.items():
+        line = f'{name:<46s}{format_time(per_item(result)):>12s}{result["noise"]:>8.1%}'
+        base = baseline.get(name)
+        if base is not None and base.get('per') != result['per']:
+            line += f'{"":>12s}{"":>9s}  input size differs ({base.get("per")} vs {result["per"]}), not compared'
+        elif base is not None:
+            change = per_item(result) / per_item(base) - 1
+            line += f'{format_time(per_item(base)):>12s}{change:>+9.1%}'
+            noise = NOISE_FACTOR * (result['noise'] + base.get('noise', 0.))
+            if change > threshold and change > noise:
+                line += '  REGRESSION'
+                regressions.append(name)
+            elif change > threshold:
+                line += f'  (within noise {noise:.0%})'
+        print(line)
+    return regressions
+
+
+def format_time(seconds):
+    if seconds >= 1e-1:
+        return f'{seconds:.2f} s'
+    if seconds >= 1e-4:
+        return f'{seconds * 1e3:.2f} ms'
+    return f'{seconds * 1e6:.2f} us'
+
+
+def main():
+    parser = argparse.ArgumentParser(description='运行基准测试并与基线比较')
+    parser.add_argument('-k', dest='patterns', action='append', help='只运行名称包含该字符串的用例，可重复')
+    parser.add_argument('--baseline', default=BASELINE)
+    parser.add_argument('--save', action='store_true', help='把本次结果保存为基线（只更新运行了的用例）')
+    parser.add_argument('--threshold', type=float, default=0.3, help='比基线慢多少（比例）算退步')
+    parser.add_argument('--large-frames', type=int, default=100_000, help='大文件用例的帧数')
+    parser.add_argument('--min-time', type=float, default=0.2, help='每组至少运行多少秒')
+    parser.add_argument('--list', action='store_true', help='列出所有用例')
+    args = parser.parse_args()
+
+    if args.list:
+        print('\n'.join(CASES))
+        return 0
+    names = [name for name in CASES if not args.patterns or any(p in name for p in args.patterns)]
+    baseline = {}
+    if os.path.exists(args.baseline):
+        with open(args.baseline, encoding='utf-8') as f:
+            saved = json.load(f)
+        baseline = saved['results']
+        if saved.get('machine') != machine():
+            print(f'warning: baseline was recorded on {saved.get("machine")}')
+        if saved.get('large_frames', args.large_frames) != args.large_frames:
+            print(f'warning: baseline used --large-frames {saved["large_frames"]}, load cases are not compared')
+
+    inputs = Inputs(args.large_frames)
+    try:
+        results = run(names, inputs, args.min_time)
+    finally:
+        inputs.cleanup()
+    regressions = compare(results, baseline, args.threshold)
+
+    if args.save:
+        with open(args.baseline, 'w', encoding='utf-8') as f:
+            json.dump({'machine': machine(), 'large_frames': args.large_frames, 'results': {**baseline, **results}},
+                      f, indent=1)
+        print(f'baseline saved to {args.baseline}')
+    elif regressions:
+        print(f'{len(regressions)} case(s) more than {args.threshold:.0%} slower than the baseline')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,43 @@
+"""逐帧打分着色：interp1d + get_color 列表推导与 scoring 查找表的对比
+
+    python -m benchmarks.scoring
+"""
+import os
+
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+
+import numpy as np
+from PyQt5.QtGui import QGuiApplication
+from scipy.interpolate import interp1d
+
+from benchmarks.common import measure, report
+from cosine_distance import x_values, y_values
+from detect_utils import poses_to_bone_arrays
+from plot_utils import SkeletonRenderer, get_color
+from scoring import DEFAULT_CURVE, unpack_rgba
+
+SESSION = 'videos/session1/1-side step+clap.npy'
+legacy_function = interp1d(x_values, y_values, kind='linear', fill_value=(0, 1), bounds_error=False)
+
+
+def legacy_score(user, reference):
+    ys = legacy_function(np.sum(reference * user, axis=1))
+    return ys, [get_color(y) for y in ys], np.mean(ys)
+
+
+if __name__ == '__main__':
+    app = QGuiApplication([])
+    bones, _ = poses_to_bone_arrays(np.load(SESSION))
+    user, reference = bones[100], bones[110]
+
+    ys, colors, score = legacy_score(user, reference)
+    result = DEFAULT_CURVE.score_pose(user, reference)
+    print(f"max score deviation {np.abs(result.bone_scores - ys).max():.1e}, "
+          f"max color deviation {np.abs(unpack_rgba(result.colors).astype(int) - colors).max()}")
+    report('interp1d + get_color', measure(legacy_score, user, reference, number=2000))
+    report('ScoreCurve.score_pose', measure(DEFAULT_CURVE.score_pose, user, reference, number=2000))
+
+    renderer = SkeletonRenderer()
+    keypoints = np.load(SESSION)[100]
+    report('render with RGBA tuples', measure(renderer.render, keypoints, None, colors, number=200))
+    report('render with packed QRgb', measure(renderer.render, keypoints, None, result.colors, number=200))
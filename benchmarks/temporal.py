@@ -0,0 +1,54 @@
+"""DTW 打分：反对角线向量化与逐格循环的一致性检查，实时打分与整段打分的耗时
+
+    python -m benchmarks.temporal
+"""
+import numpy as np
+
+from benchmarks.common import measure, report
+from detect_utils import poses_to_bone_arrays
+from temporal_scoring import TemporalScorer, dtw, frame_costs, score_attempt
+
+SESSION = 'videos/session1/1-side step+clap.npy'
+LAG = 10  # 模拟用户慢 LAG 帧
+
+
+def dtw_loop(costs, subsequence=False):
+    n, m = costs.shape
+    D = np.full((n + 1, m + 1), np.inf)
+    D[0, 0] = 0.
+    if subsequence:
+        D[0, :] = 0.
+    for i in range(1, n + 1):
+        for j in range(1, m + 1):
+            D[i, j] = costs[i - 1, j - 1] + min(D[i - 1, j], D[i, j - 1], D[i - 1, j - 1])
+    return D
+
+
+if __name__ == '__main__':
+    bones, _ = poses_to_bone_arrays(np.load(SESSION))
+    scorer = TemporalScorer()
+    position = 200
+    for t in range(position - scorer.buffer.capacity + 1, position + 1):
+        scorer.push(bones[t - LAG])
+    user = scorer.buffer.latest()
+    window = bones[position - scorer.max_lag - scorer.buffer.capacity + 1:position + scorer.max_lead + 1]
+    costs = frame_costs(user, window)
+    err = np.abs(dtw(costs, subsequence=True)[1:, 1:] - dtw_loop(costs, subsequence=True)[1:, 1:]).max()
+    assert err < 1e-9, f'向量化 DTW 与逐格循环的偏差 {err:.2e}'
+    print(f"max deviation from loop DTW {err:.2e}")
+
+    result = scorer.score(bones, position)
+    frozen = np.mean(np.sum(user[-1] * bones[position], axis=-1))
+    print(f"user {LAG} frames late: matched reference frame {result.reference_frame} (shown {position}), "
+          f"score {result.score * 100:.1f}%, mean cosine against the shown frame {frozen:.3f}")
+
+    print(f"live window {costs.shape[0]}x{costs.shape[1]}")
+    report('  loop DTW', measure(dtw_loop, costs, True, number=5))
+    report('  TemporalScorer.score', measure(scorer.score, bones, position, number=200))
+
+    # 用户慢 20%，连做两遍
+    idx = np.tile(np.linspace(0, len(bones) - 1, int(len(bones) * 1.2)).round().astype(int), 2)
+    attempt = score_attempt(bones[idx], bones, repetitions=2)
+    print(f"attempt of {len(idx)} frames: score {attempt.score * 100:.1f}%, "
+          f"repetitions {np.round(attempt.repetition_scores * 100, 1).tolist()}")
+    report('  score_attempt', measure(score_attempt, bones[idx], bones, 2, repeat=3, number=1), len(idx), 'frame')
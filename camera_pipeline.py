@@ -0,0 +1,356 @@
+import queue
+import threading
+import time
+from collections import namedtuple
+
+import cv2
+import numpy as np
+from PyQt5.QtCore import QThread, pyqtSignal
+from PyQt5.QtGui import QImage
+
+from cosine_distance import numpy_to_bone_arrays
+from detect_utils import landmarks_to_numpy, landmarks_to_visibility
+from frame_sources import RecordedPose
+from inference_control import AdaptiveController, to_full_frame, update_roi
+from landmark_filter import LandmarkFilter
+
+
+def mp_solutions():
+    """mediapipe 只在真正做姿态估计时才导入，回放关键点流不需要安装它"""
+    import mediapipe as mp
+    return mp.solutions
+
+# read_start、captured 为 perf_counter 时刻，timestamp 为帧源给出的媒体时间（秒）
+CapturedFrame = namedtuple('CapturedFrame', ['frame', 'read_start', 'captured', 'timestamp'])
+END_OF_STREAM = object()  # 帧源读完后放入队列，InferenceThread 收到后发出 stream_ended 并退出
+
+
+class FrameQueue:
+    """有界队列，满时丢弃最旧的帧，消费者永远拿到最新的画面
+
+    lossless 为 True 时满了就等待、不丢帧（回放测试时让每一帧都经过完整的管线），
+    put 超时返回 False，调用方借此检查线程是否被要求退出。
+    pool 为采集缓冲区的空闲列表：被丢弃或清空的帧自动归还，消费者处理完一帧后调用 release 归还
+    """
+
+    def __init__(self, maxsize=1, lossless=False):
+        self.maxsize = maxsize
+        self.lossless = lossless
+        self._queue = queue.Queue(maxsize=maxsize)
+        self.dropped = 0
+        # 采集线程写一帧、队列里 maxsize 帧、推理线程处理一帧
+        self.pool = FramePool(maxsize + 2)
+
+    def release(self, item):
+        if isinstance(item, CapturedFrame) and isinstance(item.frame, np.ndarray):
+            self.pool.release(item.frame)
+
+    def put(self, item, timeout=None):
+        if self.lossless:
+            try:
+                self._queue.put(item, timeout=timeout)
+                return True
+            except queue.Full:
+                return False
+        while True:
+            try:
+                self._queue.put_nowait(item)
+                return True
+            except queue.Full:
+                try:
+                    self.release(self._queue.get_nowait())
+                    self.dropped += 1
+                except queue.Empty:
+                    pass
+
+    def get(self, timeout=None):
+        try:
+            return self._queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+    def clear(self):
+        while True:
+            try:
+                self.release(self._queue.get_nowait())
+            except queue.Empty:
+                return
+
+
+class FramePool:
+    """采集缓冲区的空闲列表
+
+    acquire 取一个空闲缓冲区，没有空闲的时候在 count 个以内新分配，超过则等待别人 release；
+    缓冲区只有归还之后才会被再次写入，推理线程正在处理的帧不会被采集线程覆盖。
+    分辨率变化时丢弃旧尺寸的缓冲区（仍在使用的归还时直接丢弃）
+    """
+
+    def __init__(self, count=3):
+        self.count = count
+        self.shape = None
+        self.dtype = None
+        self._free = []
+        self._owned = {}  # id -> 当前尺寸下分配的全部缓冲区
+        self._cond = threading.Condition()
+
+    def acquire(self, shape, dtype=np.uint8, timeout=None):
+        """超时返回 None"""
+        shape, dtype = tuple(shape), np.dtype(dtype)
+        with self._cond:
+            if shape != self.shape or dtype != self.dtype:
+                self.shape, self.dtype = shape, dtype
+                self._free, self._owned = [], {}
+            while not self._free and len(self._owned) >= self.count:
+                if not self._cond.wait(timeout):
+                    return None
+                if shape != self.shape:
+                    return self.acquire(shape, dtype, timeout)
+            if self._free:
+                return self._free.pop()
+            buffer = np.empty(shape, dtype)
+            self._owned[id(buffer)] = buffer
+            return buffer
+
+    def release(self, buffer):
+        with self._cond:
+            if self._owned.get(id(buffer)) is buffer and not any(b is buffer for b in self._free):
+                self._free.append(buffer)
+                self._cond.notify()
+
+
+class ImageRing:
+    """发给 GUI 的 RGB 图像，直接由 cvtColor 写入 QImage 自己的内存，不经过中间数组、不拷贝
+
+    QImage 是隐式共享的：GUI 线程（FrameView 或排队中的信号）还持有某张图像时，bits() 会先 detach，
+    GUI 手里的那份不会被改写；已经没有人持有时直接复用，不分配内存。图像的内存归 QImage 所有，与线程的生命周期无关
+    """
+
+    def __init__(self, count=3):
+        self.count = count
+        self.images = []
+        self.index = 0
+
+    def next(self, width, height):
+        """下一张图像和它内存上的 (height, width, 3) 数组"""
+        if not self.images or self.images[0].width() != width or self.images[0].height() != height:
+            self.images = [QImage(width, height, QImage.Format_RGB888) for _ in range(self.count)]
+        image = self.images[self.index]
+        self.index = (self.index + 1) % self.count
+        bits = image.bits()  # 非 const 访问，图像被共享时在这里 detach
+        bits.setsize(image.sizeInBytes())
+        return image, np.ndarray((height, width, 3), np.uint8, buffer=bits, strides=(image.bytesPerLine(), 3, 1))
+
+
+def add_annotation(results, image):
+    ret = False
+    if results.pose_landmarks:
+        color = (0, 255, 0)
+        ret = True
+        for idx, lm in enumerate(results.pose_landmarks.landmark):
+            # x = lm.x * image.shape[1]
+            # y = lm.y * image.shape[0]
+            # z = lm.z * image.shape[1]
+            visibility = lm.visibility  # 获取可见性
+            # 根据可见性设置不同的颜色
+            if visibility < 0.5:
+                color = (0, 0, 255)  # 红色，表示不可见
+                ret = False
+        mp_drawing = mp_solutions().drawing_utils
+        mp_drawing.draw_landmarks(
+            image, results.pose_landmarks, mp_solutions().pose.POSE_CONNECTIONS,
+            landmark_drawing_spec=mp_drawing.DrawingSpec(color=color, thickness=2, circle_radius=2),
+            connection_drawing_spec=mp_drawing.DrawingSpec(color=color, thickness=2))
+    return ret
+
+
+class CaptureThread(QThread):
+    """只负责从帧源（frame_sources）读帧，读到的帧连同采集时刻放进有界队列，帧源关闭后放入 END_OF_STREAM
+
+    帧直接读进 frame_queue.pool 的空闲缓冲区（VideoCapture.read 的 image 参数），不为每一帧分配新数组；
+    没有空闲缓冲区时等待推理线程归还
+    """
+
+    def __init__(self, camera, frame_queue: FrameQueue):
+        super().__init__()
+        self.camera = camera
+        self.frame_queue = frame_queue
+        self.pool = frame_queue.pool
+        self.shape = None
+
+    def acquire(self):
+        """第一帧之前不知道分辨率，返回 None；被要求退出时也返回 None"""
+        while self.shape is not None and not self.isInterruptionRequested():
+            buffer = self.pool.acquire(self.shape, timeout=0.1)
+            if buffer is not None:
+                return buffer
+        return None
+
+    def run(self):
+        retry_delay = 0.
+        while not self.isInterruptionRequested() and self.camera.isOpened():
+            self.camera.wait()
+            read_start = time.perf_counter()
+            buffer = self.acquire()
+            ret, frame = self.camera.read(image=buffer)
+            if frame is not buffer and buffer is not None:
+                self.pool.release(buffer)  # 没有读进缓冲区（读失败或分辨率变了）
+            if not ret:
+                # 摄像头暂时读不到帧（还开着）时退避重试，不空转
+                retry_delay = min(max(retry_delay * 2, 0.005), 0.1)
+                time.sleep(retry_delay)
+                continue
+            retry_delay = 0.
+            if isinstance(frame, np.ndarray):
+                self.shape = frame.shape  # 第一帧之后才知道分辨率
+            if not self.put(CapturedFrame(frame, read_start, time.perf_counter(), self.camera.timestamp)):
+                return
+        if not self.isInterruptionRequested():
+            self.put(END_OF_STREAM)
+
+    def put(self, item):
+        """不丢帧的队列满时等待，期间被要求退出则返回 False"""
+        while not self.frame_queue.put(item, timeout=0.1):
+            if self.isInterruptionRequested():
+                return False
+        return True
+
+
+def set_landmarks(pose_landmarks, landmarks):
+    for lm, (x, y, z) in zip(pose_landmarks.landmark, landmarks.tolist()):
+        lm.x, lm.y, lm.z = x, y, z
+
+
+class InferenceThread(QThread):
+    """从队列取最新帧做姿态估计，结果和可直接绘制的图像通过信号发回 GUI 线程
+
+    controller 根据端到端延迟选择缩放比例、人体区域裁剪、隔帧推理和模型大小，档位变化时发出 settings_changed。
+    关键点流（RecordedPose）跳过姿态估计，直接进入平滑和骨骼向量转换。
+    detections_updated 的 timestamp 为帧源给出的媒体时间（秒），stamps 记录这一帧经过各阶段的 perf_counter 时刻：
+    read（开始读帧）、captured、dequeued（推理线程取出）、inferred（姿态估计完成）、emitted（信号发出）
+    recorder（frame_sources.LandmarkRecorder）不为空时逐帧记录未经平滑的检测结果
+    """
+    detections_updated = pyqtSignal(dict)
+    frame_ready = pyqtSignal(QImage)
+    annotated = pyqtSignal(bool)  # 本帧是否完整识别到全身
+    settings_changed = pyqtSignal(object)  # InferenceSettings
+    stream_ended = pyqtSignal()
+
+    def __init__(self, frame_queue: FrameQueue, min_detection_confidence=0.5, min_tracking_confidence=0.5,
+                 landmark_filter=None, controller=None, recorder=None):
+        super().__init__()
+        self.frame_queue = frame_queue
+        self.min_detection_confidence = min_detection_confidence
+        self.min_tracking_confidence = min_tracking_confidence
+        # 检测结果先平滑再发出，避免骨骼颜色和得分随抖动闪烁；传入 False 关闭
+        self.landmark_filter = LandmarkFilter() if landmark_filter is None else landmark_filter
+        self.controller = AdaptiveController() if controller is None else controller
+        self.frame_index = 0
+        self.roi = None  # 上一次检测到的人体区域（像素）
+        self.last_results = None  # 隔帧推理时用来绘制外推的姿势
+        self.display_images = ImageRing(3)  # 发给 GUI 的 RGB 图像
+        self.recorder = recorder
+        self.timestamp = None
+        self.stamps = {}
+
+    def create_pose(self, model_complexity):
+        return mp_solutions().pose.Pose(model_complexity=model_complexity,
+                                        min_detection_confidence=self.min_detection_confidence,
+                                        min_tracking_confidence=self.min_tracking_confidence)
+
+    def run(self):
+        pose, model_complexity = None, None
+        try:
+            while not self.isInterruptionRequested():
+                item = self.frame_queue.get(timeout=0.1)
+                if item is None:
+                    continue
+                if item is END_OF_STREAM:
+                    self.stream_ended.emit()
+                    return
+                self.timestamp = item.timestamp
+                self.stamps = {'read': item.read_start, 'captured': item.captured, 'dequeued': time.perf_counter()}
+                if isinstance(item.frame, RecordedPose):
+                    self.replay(item.frame, item.timestamp)
+                    continue
+                settings = self.controller.settings
+                if settings.model_complexity != model_complexity:  # 换模型需要重建 Pose
+                    if pose is not None:
+                        pose.close()
+                    model_complexity = settings.model_complexity
+                    pose = self.create_pose(model_complexity)
+                try:
+                    self.process_frame(pose, item.frame, item.timestamp, settings)
+                finally:
+                    self.frame_queue.release(item)  # 缓冲区还给采集线程
+                if self.controller.record((time.perf_counter() - item.captured) * 1000):
+                    self.settings_changed.emit(self.controller.settings)
+        finally:
+            if pose is not None:
+                pose.close()
+
+    def process_frame(self, pose, frame, timestamp, settings):
+        frame = cv2.flip(frame, 1, dst=frame)  # 采集缓冲区此时归本线程所有，原地翻转
+        self.frame_index += 1
+        predicted = None
+        if settings.skip > 1 and self.frame_index % settings.skip and self.landmark_filter and self.last_results:
+            predicted = self.landmark_filter.predict(timestamp)
+            self.stamps['inferred'] = time.perf_counter()
+        if predicted is not None:
+            # 跳过推理，用速度外推的姿势
+            if self.last_results is not None:
+                set_landmarks(self.last_results.pose_landmarks, predicted)
+                add_annotation(self.last_results, frame)
+            self.emit_landmarks(predicted.copy(), carried=False, extrapolated=True)
+        else:
+            self.infer(pose, frame, timestamp, settings)
+
+        qimage, rgb = self.display_images.next(frame.shape[1], frame.shape[0])
+        cv2.cvtColor(frame, cv2.COLOR_BGR2RGB, dst=rgb)
+        self.frame_ready.emit(qimage)
+
+    def infer(self, pose, frame, timestamp, settings):
+        roi = self.roi if settings.roi else None
+        image = np.ascontiguousarray(frame[roi[1]:roi[3], roi[0]:roi[2]]) if roi is not None else frame
+        if settings.scale < 1:
+            image = cv2.resize(image, None, fx=settings.scale, fy=settings.scale, interpolation=cv2.INTER_AREA)
+        results = pose.process(image)
+        self.stamps['inferred'] = time.perf_counter()
+
+        landmarks = visibility = None
+        if results.pose_landmarks:
+            landmarks = to_full_frame(landmarks_to_numpy(results.pose_landmarks), roi, frame.shape)
+            visibility = landmarks_to_visibility(results.pose_landmarks)
+            if roi is not None:
+                set_landmarks(results.pose_landmarks, landmarks)  # 在整幅图像上绘制
+            self.roi = update_roi(self.roi, landmarks, visibility, frame.shape)
+        else:
+            self.roi = None  # 丢失后用整幅图像重新检测
+        self.last_results = results if results.pose_landmarks else None
+        retval = add_annotation(results, frame)
+        self.emit_detections(landmarks, visibility, timestamp)
+        self.annotated.emit(retval)
+
+    def replay(self, recorded: RecordedPose, timestamp):
+        self.stamps['inferred'] = time.perf_counter()
+        landmarks = recorded.landmarks if recorded.detected else None
+        self.emit_detections(landmarks, recorded.visibility, timestamp)
+        self.annotated.emit(recorded.detected and bool(np.all(recorded.visibility >= 0.5)))
+
+    def emit_detections(self, landmarks, visibility, t):
+        """短暂丢失时沿用滤波器里的上一个姿势（carried 为 True）"""
+        if self.recorder is not None:
+            self.recorder.append(landmarks, visibility, t)
+        if not self.landmark_filter:
+            if landmarks is not None:
+                self.emit_landmarks(landmarks, carried=False)
+            return
+        landmarks, carried = self.landmark_filter.update(landmarks, visibility, t)
+        if landmarks is not None:
+            self.emit_landmarks(landmarks.copy(), carried)  # 滤波器的内部数组会被下一帧覆盖
+
+    def emit_landmarks(self, landmarks, carried, extrapolated=False):
+        bone_arrays = numpy_to_bone_arrays(landmarks)
+        self.stamps['emitted'] = time.perf_counter()
+        self.detections_updated.emit({'bone_arrays': bone_arrays, 'landmarks': landmarks, 'carried': carried,
+                                      'extrapolated': extrapolated, 'timestamp': self.timestamp,
+                                      'stamps': dict(self.stamps)})
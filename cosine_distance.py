@@ -1,18 +1,10 @@
 import time
 import numpy as np
-from scipy.spatial.transform import Rotation as R
-from scipy.interpolate import interp1d
 
 
-connections = [
-    (12, 24), (24, 26), (26, 28), (28, 32), (32, 30), (30, 28),
-    (11, 23), (23, 25), (25, 27), (27, 29), (29, 31), (31, 27),
-    (12, 11), (24, 23),
-    (12, 14), (14, 16), (16, 18), (18, 20), (20, 16), (16, 22),
-    (11, 13), (13, 15), (15, 17), (17, 19), (19, 15), (15, 21),
-    (8, 6), (6, 5), (5, 4), (4, 0), (0, 1), (1, 2), (2, 3), (3, 7),
-    (10, 9)
-]
+from detect_utils import connections, landmarks_to_numpy, poses_to_bone_arrays
+from quaternion import to_matrix as quaternion_to_matrix
+from scoring import DEFAULT_X, DEFAULT_Y
 
 np.random.seed(42)
 
@@ -47,6 +39,102 @@ def kabsch(P, Q):
     return R
 
 
+def kabsch_batch(P, Q):
+    """批量版 kabsch，P、Q 形状为 (B, K, 3)。返回 (B, 3, 3) 的旋转矩阵（与 kabsch 约定相同）和对齐后的 RMSD (B,)"""
+    P = np.asarray(P, dtype=float)
+    Q = np.asarray(Q, dtype=float)
+    P_centered = P - np.mean(P, axis=1, keepdims=True)
+    Q_centered = Q - np.mean(Q, axis=1, keepdims=True)
+
+    # 每一对的协方差矩阵，一次性做 SVD
+    C = np.einsum('bki,bkj->bij', P_centered, Q_centered)
+    U, _, Vt = np.linalg.svd(C)
+    V = np.swapaxes(Vt, 1, 2)
+    Ut = np.swapaxes(U, 1, 2)
+
+    # 每个元素单独做反射修正：diag([1, 1, d])
+    d = np.sign(np.linalg.det(V @ Ut))
+    D = np.ones((len(P), 3))
+    D[:, 2] = d
+    R = (V * D[:, None, :]) @ Ut
+
+    aligned = P_centered @ np.swapaxes(R, 1, 2)
+    rmsd = np.sqrt(np.sum((aligned - Q_centered) ** 2, axis=(1, 2)) / P.shape[1])
+    return R, rmsd
+
+
+def _horn_matrices(S):
+    """由 (..., 3, 3) 的协方差矩阵构造 Horn 方法中的 (..., 4, 4) 对称矩阵"""
+    Sxx, Sxy, Sxz = S[..., 0, 0], S[..., 0, 1], S[..., 0, 2]
+    Syx, Syy, Syz = S[..., 1, 0], S[..., 1, 1], S[..., 1, 2]
+    Szx, Szy, Szz = S[..., 2, 0], S[..., 2, 1], S[..., 2, 2]
+    N = np.empty(S.shape[:-2] + (4, 4))
+    N[..., 0, 0] = Sxx + Syy + Szz
+    N[..., 1, 1] = Sxx - Syy - Szz
+    N[..., 2, 2] = -Sxx + Syy - Szz
+    N[..., 3, 3] = -Sxx - Syy + Szz
+    N[..., 0, 1] = N[..., 1, 0] = Syz - Szy
+    N[..., 0, 2] = N[..., 2, 0] = Szx - Sxz
+    N[..., 0, 3] = N[..., 3, 0] = Sxy - Syx
+    N[..., 1, 2] = N[..., 2, 1] = Sxy + Syx
+    N[..., 1, 3] = N[..., 3, 1] = Szx + Sxz
+    N[..., 2, 3] = N[..., 3, 2] = Syz + Szy
+    return N
+
+
+def horn(P, Q):
+    """Horn 四元数闭式解，结果与 kabsch 相同（R @ p 对齐到 q），只需对 4x4 对称矩阵求最大特征向量"""
+    P_centered = P - np.mean(P, axis=0)
+    Q_centered = Q - np.mean(Q, axis=0)
+    # 单帧时用 python 标量构造矩阵，避免大量 0 维数组运算的开销
+    (Sxx, Sxy, Sxz), (Syx, Syy, Syz), (Szx, Szy, Szz) = np.dot(P_centered.T, Q_centered).tolist()
+    N = np.array([
+        [Sxx + Syy + Szz, Syz - Szy, Szx - Sxz, Sxy - Syx],
+        [Syz - Szy, Sxx - Syy - Szz, Sxy + Syx, Szx + Sxz],
+        [Szx - Sxz, Sxy + Syx, -Sxx + Syy - Szz, Syz + Szy],
+        [Sxy - Syx, Szx + Sxz, Syz + Szy, -Sxx - Syy + Szz],
+    ])
+    _, v = np.linalg.eigh(N)
+    w, x, y, z = v[:, -1].tolist()
+    return np.array([
+        [1 - 2 * (y * y + z * z), 2 * (x * y - z * w), 2 * (x * z + y * w)],
+        [2 * (x * y + z * w), 1 - 2 * (x * x + z * z), 2 * (y * z - x * w)],
+        [2 * (x * z - y * w), 2 * (y * z + x * w), 1 - 2 * (x * x + y * y)],
+    ])
+
+
+def horn_batch(P, Q):
+    """批量版 horn，接口与 kabsch_batch 相同"""
+    P = np.asarray(P, dtype=float)
+    Q = np.asarray(Q, dtype=float)
+    P_centered = P - np.mean(P, axis=1, keepdims=True)
+    Q_centered = Q - np.mean(Q, axis=1, keepdims=True)
+    S = np.einsum('bki,bkj->bij', P_centered, Q_centered)
+    _, v = np.linalg.eigh(_horn_matrices(S))
+    R = quaternion_to_matrix(v[..., -1])
+
+    aligned = P_centered @ np.swapaxes(R, 1, 2)
+    rmsd = np.sqrt(np.sum((aligned - Q_centered) ** 2, axis=(1, 2)) / P.shape[1])
+    return R, rmsd
+
+
+# 对齐算法：'kabsch'（SVD）或 'horn'（四元数闭式解）
+ALIGNMENT_BACKEND = 'kabsch'
+alignment_backends = {
+    'kabsch': (kabsch, kabsch_batch),
+    'horn': (horn, horn_batch),
+}
+
+
+def align_rotation(P, Q, backend=None):
+    """用配置的对齐算法求 P -> Q 的最优旋转"""
+    return alignment_backends[backend or ALIGNMENT_BACKEND][0](P, Q)
+
+
+def align_rotation_batch(P, Q, backend=None):
+    return alignment_backends[backend or ALIGNMENT_BACKEND][1](P, Q)
+
+
 def best_rotation_using_svd(P, Q):
     H = np.dot(P.T, Q)
     U, _, Vt = np.linalg.svd(H)
@@ -54,33 +142,17 @@ def best_rotation_using_svd(P, Q):
     return R
 
 
-def landmarks_to_numpy(landmarks):
-    return np.array([(landmark.x, landmark.y, landmark.z) for landmark in landmarks.landmark])
-
-
 def landmarks_to_bone_arrays(landmarks):
-    arr = np.zeros((len(connections), 3))
-    for i, (start, end) in enumerate(connections):
-        dx = landmarks.landmark[end].x - landmarks.landmark[start].x
-        dy = landmarks.landmark[end].y - landmarks.landmark[start].y
-        dz = landmarks.landmark[end].z - landmarks.landmark[start].z
-        arr[i, :] = dx, dy, dz
-        arr[i] /= np.sqrt(dx**2+dy**2+dz**2)
-    return arr
+    return poses_to_bone_arrays(landmarks_to_numpy(landmarks))[0]
 
 
 def numpy_to_bone_arrays(arr):
-    ret_arr = np.zeros((len(connections), 3))
-    for i, (start, end) in enumerate(connections):
-        dx = arr[end, 0] - arr[start, 0]
-        dy = arr[end, 1] - arr[start, 1]
-        dz = arr[end, 2] - arr[start, 2]
-        ret_arr[i, :] = dx, dy, dz
-        ret_arr[i] /= np.sqrt(dx ** 2 + dy ** 2 + dz ** 2)
-    return ret_arr
+    return poses_to_bone_arrays(arr)[0]
 
 
 if __name__ == "__main__":
+    from scipy.spatial.transform import Rotation as R  # 只有这里的演示用到 scipy，不放在启动路径上
+
     # landmarks1 = ...  # 第一个姿态的关键点
     # landmarks2 = ...  # 第二个姿态的关键点
     #
@@ -109,7 +181,10 @@ if __name__ == "__main__":
 
 
 # 定义x和y值
-x_values = [0, np.cos(np.radians(60)), np.cos(np.radians(45)), np.cos(np.radians(30)), 1]
-y_values = [0, 0.3, 0.5, 0.9, 1]
-# 使用线性插值创建插值函数
-interpolation_function = interp1d(x_values, y_values, kind='linear', fill_value=(0, 1), bounds_error=False)
+x_values = list(DEFAULT_X)
+y_values = list(DEFAULT_Y)
+
+
+# 线性插值，范围外取两端的值；逐帧打分请用 scoring.ScoreCurve 的查找表
+def interpolation_function(x):
+    return np.interp(x, x_values, y_values)
@@ -1,3 +1,6 @@
+import os
+import tempfile
+
 import numpy as np
 from collections import namedtuple
 
@@ -25,24 +28,106 @@ for i in range(33):
 for m, n in [(12, 11), (12, 24), (11, 12), (11, 23), (23, 11), (23, 24), (24, 23), (24, 12), (18, 20), (20, 18), (17, 19), (19, 17), (32, 30), (30, 32), (29, 31), (31, 29)]:
     neighbours[m].remove(n)
 
+# 每根骨骼的起止关键点下标，供向量化计算使用
+bone_starts = np.array([m for m, n in connections])
+bone_ends = np.array([n for m, n in connections])
+
+RETARGET_BASES = (12, 11, 24, 23)  # 双肩、双髋，四肢从这里长出去
+
+
+def retarget_order(bases=RETARGET_BASES):
+    """从 bases 出发沿 neighbours 做 BFS，返回 (parent, bone, levels)
+
+    parent[i] 为关键点 i 在遍历树中的父节点（未到达的点和 bases 为自身），bone[i] 为这条边在 connections 中的下标（没有为 -1），
+    levels 为按层排列的关键点下标数组，同一层的点只依赖上一层，可以一次算完
+    """
+    parent = np.arange(len(neighbours))
+    bone = np.full(len(neighbours), -1)
+    visited = np.zeros(len(neighbours), dtype=bool)
+    visited[list(bases)] = True
+    levels = []
+    frontier = list(bases)
+    while frontier:
+        level = []
+        for i in frontier:
+            for j in neighbours[i]:
+                if not visited[j]:
+                    visited[j] = True
+                    parent[j] = i
+                    bone[j] = connections.index((i, j)) if (i, j) in connections else connections.index((j, i))
+                    level.append(j)
+        if level:
+            levels.append(np.array(level))
+        frontier = level
+    return parent, bone, levels
+
+
+retarget_parent, retarget_bone, retarget_levels = retarget_order()
 
 
 def landmarks_to_numpy(landmarks):
     return np.array([(landmark.x, landmark.y, landmark.z) for landmark in landmarks.landmark])
 
 
+def landmarks_to_visibility(landmarks):
+    return np.array([landmark.visibility for landmark in landmarks.landmark])
+
+
+def poses_to_bone_arrays(poses):
+    """(..., 33, 3) 的关键点 -> (..., 35, 3) 的单位骨骼向量和 (..., 35) 的骨骼长度，长度为 0 的骨骼方向记为 0"""
+    poses = np.asarray(poses, dtype=float)
+    bones = poses[..., bone_ends, :] - poses[..., bone_starts, :]
+    lengths = np.sqrt(np.einsum('...ij,...ij->...i', bones, bones))
+    units = np.divide(bones, lengths[..., None], out=np.zeros_like(bones), where=lengths[..., None] > 0)
+    return units, lengths
+
+
 def landmarks_to_bone_arrays(landmarks):
-    arr = np.zeros((len(connections), 3))
-    lens = np.zeros(len(connections))
-    for i, (start, end) in enumerate(connections):
-        dx = landmarks.landmark[end].x - landmarks.landmark[start].x
-        dy = landmarks.landmark[end].y - landmarks.landmark[start].y
-        dz = landmarks.landmark[end].z - landmarks.landmark[start].z
-        arr[i, :] = dx, dy, dz
-        length = np.sqrt(dx**2+dy**2+dz**2)
-        arr[i] /= length
-        lens[i] = length
-    return arr, lens
+    return poses_to_bone_arrays(landmarks_to_numpy(landmarks))
+
+
+def bone_cache_path(path):
+    return os.path.splitext(path)[0] + '.bones.cache'
+
+
+def load_session_bone_arrays(path, poses=None, mmap_mode=None, chunk_size=4096):
+    """读取/生成与 .npy 同目录的骨骼向量缓存，缓存比源文件旧则重新计算。返回 (单位骨骼向量, 骨骼长度)
+    mmap_mode 不为空时以内存映射方式打开缓存；重新计算时分块进行，不会一次性读入整个文件"""
+    cache_path = bone_cache_path(path)
+    if poses is None:
+        poses = np.load(path, mmap_mode=mmap_mode)
+    shape = (len(poses), len(connections), 4)
+    if os.path.exists(cache_path) and os.path.getmtime(cache_path) >= os.path.getmtime(path):
+        try:
+            cache = np.load(cache_path, mmap_mode=mmap_mode)
+            if cache.shape == shape:
+                return cache[..., :3], cache[..., 3]
+        except (OSError, ValueError):
+            pass
+    if not len(poses):
+        return np.zeros(shape[:2] + (3,)), np.zeros(shape[:2])
+
+    # 临时文件名唯一，多个线程（预读、姿势索引）同时为同一个文件生成缓存时互不干扰，最后一个 replace 的生效
+    try:
+        fd, tmp_path = tempfile.mkstemp(suffix='.tmp', prefix=os.path.basename(cache_path) + '.',
+                                        dir=os.path.dirname(cache_path) or '.')
+        os.close(fd)
+        cache = np.lib.format.open_memmap(tmp_path, mode='w+', dtype=np.float64, shape=shape)
+    except OSError:  # 目录只读时只是不缓存
+        cache = np.empty(shape)
+    for i in range(0, len(poses), chunk_size):
+        units, lengths = poses_to_bone_arrays(poses[i:i + chunk_size])
+        cache[i:i + chunk_size, :, :3] = units
+        cache[i:i + chunk_size, :, 3] = lengths
+    if isinstance(cache, np.memmap):
+        cache.flush()
+        del cache
+        try:
+            os.replace(tmp_path, cache_path)
+            cache = np.load(cache_path, mmap_mode=mmap_mode)
+        except OSError:  # 旧缓存仍被占用（Windows）时直接用临时文件
+            cache = np.load(tmp_path, mmap_mode=mmap_mode)
+    return cache[..., :3], cache[..., 3]
 
 
 def normalize(arr):
@@ -56,21 +141,30 @@ def get_bottom_point(arr):
     return arr[i], i
 
 
+def retarget(poses, reference, multiple=1, preserve_lengths=False, bone_lengths=None):
+    """把 poses 的四肢换成 reference 的骨骼方向，双肩、双髋和面部保持不动，(..., 33, 3) 整段一起计算
+
+    默认每根骨骼取 reference 的长度；preserve_lengths 时只取方向，长度用用户自己的（bone_lengths 为
+    poses_to_bone_arrays / load_session_bone_arrays 给出的 (..., 35) 骨骼长度，不传则现算）。骨骼长度都乘以 multiple
+    """
+    poses = np.asarray(poses, dtype=float)
+    reference = np.asarray(reference, dtype=float)
+    if preserve_lengths and bone_lengths is None:
+        bone_lengths = poses_to_bone_arrays(poses)[1]
+    out = np.array(np.broadcast_to(poses, np.broadcast_shapes(poses.shape, reference.shape)))
+    for level in retarget_levels:
+        parents = retarget_parent[level]
+        offset = reference[..., level, :] - reference[..., parents, :]
+        if preserve_lengths:
+            length = np.sqrt(np.einsum('...ij,...ij->...i', offset, offset))[..., None]
+            scale = np.asarray(bone_lengths)[..., retarget_bone[level], None]
+            offset = np.divide(offset * scale, length, out=np.zeros_like(offset), where=length > 0)
+        if multiple != 1:
+            offset *= multiple
+        out[..., level, :] = out[..., parents, :] + offset
+    return out
+
+
 def transform(arr, arr2, multiple=1):  # 你的关键点、标准关键点
-    visited = np.zeros(33, dtype=bool)
-    arr1 = arr.copy()
-
-    def dfs(i):
-        visited[i] = True
-        for idx in neighbours[i]:  # connect i->idx
-            dl2 = arr2[idx] - arr2[i]
-            # direction = dl2 / (dl2 * dl2).sum()
-            # dl = arr[idx] - arr[i]
-            # length = (dl * dl).sum()
-            arr1[idx] = arr1[i] + dl2*multiple
-            if not visited[idx]:
-                dfs(idx)
-    for base in [12, 11, 24, 23]:
-        dfs(base)
-    return arr1
+    return retarget(arr, arr2, multiple)
 
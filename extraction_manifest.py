@@ -0,0 +1,70 @@
+"""记录每个视频的关键点提取结果，视频内容和模型参数都没变时跳过重新提取"""
+import hashlib
+import json
+import os
+
+MANIFEST_NAME = 'manifest.json'
+
+
+def file_sha256(path, block_size=1 << 20):
+    sha = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while True:
+            block = f.read(block_size)
+            if not block:
+                break
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def write_json(path, obj):
+    """先写临时文件再替换，中途崩溃不会留下半个 json"""
+    with open(path + '.tmp', 'w', encoding='utf-8') as f:
+        json.dump(obj, f, ensure_ascii=False, indent=2)
+    os.replace(path + '.tmp', path)
+
+
+def read_json(path):
+    try:
+        with open(path, encoding='utf-8') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+class Manifest:
+    """root/manifest.json: {视频文件名: {sha256, size, mtime, settings, output, format, frames}}"""
+
+    def __init__(self, root):
+        self.root = root
+        self.path = os.path.join(root, MANIFEST_NAME)
+        self.entries = read_json(self.path) or {}
+
+    def source_hash(self, video_path):
+        """大小和修改时间都没变时沿用记录的哈希，避免每次都读完整个视频"""
+        stat = os.stat(video_path)
+        entry = self.entries.get(os.path.basename(video_path))
+        if entry and entry.get('size') == stat.st_size and entry.get('mtime') == stat.st_mtime:
+            return entry['sha256']
+        return file_sha256(video_path)
+
+    def is_current(self, video_path, source_hash, settings, output_path, output_format=1):
+        entry = self.entries.get(os.path.basename(video_path))
+        return (entry is not None and entry['sha256'] == source_hash and entry['settings'] == settings
+                and entry.get('format', 1) == output_format
+                and entry['output'] == os.path.basename(output_path) and os.path.exists(output_path))
+
+    def record(self, video_path, source_hash, settings, output_path, frames, output_format=1):
+        stat = os.stat(video_path)
+        self.entries[os.path.basename(video_path)] = {
+            'sha256': source_hash,
+            'size': stat.st_size,
+            'mtime': stat.st_mtime,
+            'settings': settings,
+            'output': os.path.basename(output_path),
+            'format': output_format,
+            'frames': frames,
+        }
+
+    def save(self):
+        write_json(self.path, self.entries)
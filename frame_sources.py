@@ -0,0 +1,199 @@
+"""摄像头管线的帧来源：摄像头、视频文件、录制的关键点流
+
+三者的接口与 cv2.VideoCapture 相同（isOpened / read(image=None) / release），可以直接交给 CaptureThread：
+    CameraSource         摄像头，timestamp 为读到帧的时刻
+    VideoFileSource      视频文件，按帧号和帧率计时，读完自动关闭
+    LandmarkStreamSource pose_io 格式的关键点文件，read 返回 RecordedPose，InferenceThread 跳过姿态估计
+后两者继承 PacedSource：realtime 为 True 时 wait() 按原始帧间隔等待，模拟摄像头；为 False 时尽快读出，用于可重复的性能测试。
+LandmarkRecorder 把摄像头会话中检测到的关键点存成 pose_io 格式，之后可以用 LandmarkStreamSource 重放。
+"""
+import os
+import time
+from abc import ABC, abstractmethod
+from collections import namedtuple
+
+import cv2
+import numpy as np
+
+from pose_io import load_pose_sequence, save_pose_meta
+
+RecordedPose = namedtuple('RecordedPose', ['landmarks', 'visibility', 'detected'])
+
+
+class FrameSource(ABC):
+    def __init__(self):
+        self.index = 0  # 已读出的帧数
+        self.timestamp = None  # 最近一帧的媒体时间（秒）
+
+    def wait(self):
+        """CaptureThread 每次 read 之前调用；摄像头本身按帧率出帧，不需要等待"""
+
+    @abstractmethod
+    def isOpened(self):
+        ...
+
+    @abstractmethod
+    def read(self, image=None):
+        """返回 (ret, frame)，与 cv2.VideoCapture.read 相同"""
+
+    def frame_size(self):
+        """(宽, 高)，没有图像（关键点流）时返回 None；不消耗帧"""
+        return None
+
+    def release(self):
+        pass
+
+
+class PacedSource(FrameSource):
+    """按媒体时间出帧的来源，realtime 时 wait() 等到下一帧的时刻，以第一帧为起点"""
+
+    def __init__(self, realtime=False):
+        super().__init__()
+        self.realtime = realtime
+        self._start = None
+
+    @abstractmethod
+    def next_timestamp(self):
+        """下一帧的媒体时间（秒）"""
+
+    def wait(self):
+        if not self.realtime:
+            return
+        t = self.next_timestamp()
+        if self._start is None:
+            self._start = time.perf_counter() - t
+        delay = self._start + t - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+
+
+class CameraSource(FrameSource):
+    def __init__(self, index=0):
+        super().__init__()
+        self.capture = cv2.VideoCapture(index)
+
+    def isOpened(self):
+        return self.capture.isOpened()
+
+    def frame_size(self):
+        width, height = (int(self.capture.get(p)) for p in (cv2.CAP_PROP_FRAME_WIDTH, cv2.CAP_PROP_FRAME_HEIGHT))
+        if width and height:
+            return width, height
+        ret, frame = self.capture.read()  # 个别后端读第一帧之前不知道分辨率，实时画面少一帧无妨
+        return (frame.shape[1], frame.shape[0]) if ret else None
+
+    def read(self, image=None):
+        ret, frame = self.capture.read(image=image) if image is not None else self.capture.read()
+        if ret:
+            self.index += 1
+            self.timestamp = time.perf_counter()
+        return ret, frame
+
+    def release(self):
+        self.capture.release()
+
+
+class VideoFileSource(PacedSource):
+    def __init__(self, path, realtime=False, fps=None):
+        super().__init__(realtime)
+        self.path = path
+        self.capture = cv2.VideoCapture(path)
+        self.fps = fps or self.capture.get(cv2.CAP_PROP_FPS) or 30.
+
+    def next_timestamp(self):
+        return self.index / self.fps
+
+    def isOpened(self):
+        return self.capture.isOpened()
+
+    def frame_size(self):
+        width, height = (int(self.capture.get(p)) for p in (cv2.CAP_PROP_FRAME_WIDTH, cv2.CAP_PROP_FRAME_HEIGHT))
+        return (width, height) if width and height else None
+
+    def read(self, image=None):
+        ret, frame = self.capture.read(image=image) if image is not None else self.capture.read()
+        if not ret:
+            self.release()  # 读完后 isOpened() 为 False，CaptureThread 随之结束
+            return False, None
+        self.timestamp = self.next_timestamp()
+        self.index += 1
+        return True, frame
+
+    def release(self):
+        self.capture.release()
+
+
+class LandmarkStreamSource(PacedSource):
+    """image 参数被忽略，读出的是 RecordedPose"""
+
+    def __init__(self, path, realtime=False):
+        super().__init__(realtime)
+        self.path = path
+        self.sequence = load_pose_sequence(path)
+        self.timestamps = np.asarray(self.sequence.timestamps) / 1000.
+        self.opened = True
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def next_timestamp(self):
+        return self.timestamps[min(self.index, len(self) - 1)]
+
+    def isOpened(self):
+        return self.opened
+
+    def read(self, image=None):
+        if self.index >= len(self):
+            self.opened = False
+            return False, None
+        i = self.index
+        self.timestamp = float(self.timestamps[i])
+        self.index += 1
+        s = self.sequence
+        return True, RecordedPose(np.array(s.landmarks[i], dtype=float), np.array(s.visibility[i], dtype=float),
+                                  bool(s.detected[i]))
+
+    def release(self):
+        self.opened = False
+
+
+def open_source(spec=0, realtime=True):
+    """整数或 'camera' 为摄像头，.npy 为关键点流，其余按视频文件打开"""
+    if isinstance(spec, int) or spec == 'camera' or str(spec).isdigit():
+        return CameraSource(0 if spec == 'camera' else int(spec))
+    if os.path.splitext(spec)[1].lower() == '.npy':
+        return LandmarkStreamSource(spec, realtime)
+    return VideoFileSource(spec, realtime)
+
+
+class LandmarkRecorder:
+    """逐帧记录未经平滑的检测结果；没检测到人体的帧沿用上一次的关键点（pose_io 的约定）"""
+
+    def __init__(self, n_landmarks=33):
+        self.n_landmarks = n_landmarks
+        self.landmarks = []
+        self.visibility = []
+        self.detected = []
+        self.timestamps = []
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    def append(self, landmarks, visibility, t):
+        """landmarks (33, 3) 或 None，t 为秒"""
+        detected = landmarks is not None
+        if not detected:
+            landmarks = self.landmarks[-1] if self.landmarks else np.zeros((self.n_landmarks, 3))
+            visibility = np.zeros(self.n_landmarks)
+        self.landmarks.append(np.array(landmarks, dtype=float))
+        self.visibility.append(np.array(visibility, dtype=np.float32))
+        self.detected.append(detected)
+        self.timestamps.append(t)
+
+    def save(self, path):
+        timestamps = np.asarray(self.timestamps, dtype=float)
+        timestamps -= timestamps[0] if len(timestamps) else 0.
+        fps = (len(timestamps) - 1) / timestamps[-1] if len(timestamps) > 1 and timestamps[-1] > 0 else 30.
+        np.save(path, np.array(self.landmarks).reshape(-1, self.n_landmarks, 3))
+        save_pose_meta(path, timestamps * 1000, self.detected, np.array(self.visibility).reshape(-1, self.n_landmarks),
+                       fps)
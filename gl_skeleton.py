@@ -0,0 +1,217 @@
+"""可选的 OpenGL 骨架视图
+
+骨骼拓扑（detect_utils.connections）在初始化时写入顶点缓冲，每帧只上传 33 个关键点坐标和 35 根骨骼的颜色，
+视角旋转作为一个 4x4 矩阵交给 GPU。投影方式与 plot_utils.SkeletonRenderer 相同。
+没有 OpenGL 2.1 时发出 failed 信号，由调用方退回 CPU 绘制；CI 中可用 Qt.AA_UseSoftwareOpenGL 跑软件渲染。
+"""
+import time
+
+import numpy as np
+from PyQt5.QtCore import Qt, pyqtSignal, QTimer
+from PyQt5.QtGui import QOpenGLBuffer, QOpenGLShader, QOpenGLShaderProgram, QOpenGLVersionProfile, QMatrix4x4, \
+    QVector3D, QVector4D, QSurfaceFormat
+from PyQt5.QtWidgets import QOpenGLWidget
+
+import instrumentation
+from detect_utils import connections
+from plot_utils import AXIS_COLORS, projection_matrix
+from scoring import unpack_rgba
+
+GL_POINTS = 0x0000
+GL_LINES = 0x0001
+GL_FLOAT = 0x1406
+GL_COLOR_BUFFER_BIT = 0x4000
+GL_BLEND = 0x0BE2
+GL_SRC_ALPHA = 0x0302
+GL_ONE_MINUS_SRC_ALPHA = 0x0303
+GL_VERTEX_PROGRAM_POINT_SIZE = 0x8642
+GL_POINT_SPRITE = 0x8861
+
+N_JOINTS = 33
+N_BONES = len(connections)
+AXES_POINTS = [(0, 0, 0), (0, 0, 1), (0, 1, 0), (1, 0, 0)]
+
+VERTEX_SHADER = """
+#version 120
+attribute float joint;
+attribute float bone;
+uniform vec3 joints[%(joints)d];
+uniform vec4 colors[%(colors)d];
+uniform mat4 transform;
+uniform float point_size;
+varying vec4 color;
+void main() {
+    gl_Position = transform * vec4(joints[int(joint)], 1.0);
+    gl_PointSize = point_size;
+    color = colors[int(bone)];
+}
+""" % {'joints': N_JOINTS + len(AXES_POINTS), 'colors': N_BONES + len(AXIS_COLORS) + 1}
+
+FRAGMENT_SHADER = """
+#version 120
+uniform float round_points;
+varying vec4 color;
+void main() {
+    if (round_points > 0.5) {
+        vec2 d = gl_PointCoord - vec2(0.5);
+        if (dot(d, d) > 0.25)
+            discard;
+    }
+    gl_FragColor = color;
+}
+"""
+
+
+def _vertex_data():
+    """每个顶点两个 float：关键点下标、颜色下标。依次为骨骼线段、关键点、坐标轴线段"""
+    point_color = N_BONES + len(AXIS_COLORS)
+    bones = [(j, b) for b, (start, end) in enumerate(connections) for j in (start, end)]
+    points = [(j, point_color) for j in range(N_JOINTS)]
+    axes = [(N_JOINTS + j, N_BONES + i) for i in range(len(AXIS_COLORS)) for j in (0, i + 1)]
+    return np.array(bones + points + axes, dtype=np.float32)
+
+
+def _to_qmatrix(m):
+    return QMatrix4x4(*np.asarray(m, dtype=float).ravel().tolist())
+
+
+class GLSkeletonView(QOpenGLWidget):
+    """接口与 SkeletonRenderer 对应：set_pose 更新关键点和骨骼颜色，set_view 更新视角"""
+    failed = pyqtSignal(str)  # 无法创建着色器等情况，调用方应退回 CPU 绘制
+
+    def __init__(self, parent=None, size=512, point_radius=3, line_width=2, background=(0, 0, 0, 220)):
+        super().__init__(parent)
+        fmt = QSurfaceFormat()
+        fmt.setAlphaBufferSize(8)
+        fmt.setSwapInterval(1)
+        self.setFormat(fmt)
+        self.setAttribute(Qt.WA_TransparentForMouseEvents)  # 拖动旋转由父控件处理
+
+        self.size = size
+        self.point_radius = point_radius
+        self.line_width = line_width
+        self.background = [v / 255 for v in background]  # 与主窗口的半透明底色一致
+        self.gl = None
+        self.program = None
+        self.vbo = None
+        self.keypoints = None
+        self.colors = None
+        self.skeleton_transform = None
+        self.axes_transform = None
+        self.normal_vector = None
+        self.pose_source = None  # 可选：返回 (keypoints, bone_color) 的函数，在绘制前才取数据，多次 update 只取一次
+        self.set_view((0, 1, 1))
+
+    def set_pose(self, keypoints, bone_color=None):
+        self._upload_pose(keypoints, bone_color)
+        self.update()
+
+    def _upload_pose(self, keypoints, bone_color):
+        self.keypoints = [QVector3D(*p) for p in np.asarray(keypoints, dtype=float).tolist()]
+        if bone_color is None:
+            self.colors = [QVector4D(1, 1, 1, 1)] * N_BONES
+        else:
+            if isinstance(bone_color, np.ndarray) and bone_color.ndim == 1:  # scoring 给出的 QRgb 数组
+                bone_color = unpack_rgba(bone_color)
+            self.colors = [QVector4D(*c) for c in (np.asarray(bone_color, dtype=float) / 255).tolist()]
+
+    def set_view(self, normal_vector):
+        """与 project_keypoints 一致：像素坐标 = size * P[:2] @ p（坐标轴再平移半个画面），再换算到裁剪坐标"""
+        normal_vector = tuple(np.asarray(normal_vector, dtype=float).tolist())
+        if normal_vector == self.normal_vector:
+            return
+        self.normal_vector = normal_vector
+        to_clip = np.array([[2. / self.size, 0, 0, -1], [0, -2. / self.size, 0, 1], [0, 0, 1, 0], [0, 0, 0, 1]])
+        pixels = np.zeros((4, 4))
+        pixels[:2, :3] = projection_matrix(normal_vector)[:2] * self.size
+        pixels[3, 3] = 1
+        self.skeleton_transform = _to_qmatrix(to_clip @ pixels)
+        pixels[:2, 3] = self.size * 0.5
+        self.axes_transform = _to_qmatrix(to_clip @ pixels)
+        self.update()
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        QTimer.singleShot(0, self._check_context)  # 上下文创建失败时 initializeGL 根本不会被调用
+
+    def _check_context(self):
+        if self.isVisible() and not self.isValid():
+            self.failed.emit('could not create an OpenGL context')
+
+    def initializeGL(self):
+        profile = QOpenGLVersionProfile()
+        profile.setVersion(2, 1)
+        self.gl = self.context().versionFunctions(profile)
+        if self.gl is None:
+            self.failed.emit('OpenGL 2.1 is not available')
+            return
+        self.gl.initializeOpenGLFunctions()
+
+        self.program = QOpenGLShaderProgram(self)
+        if not (self.program.addShaderFromSourceCode(QOpenGLShader.Vertex, VERTEX_SHADER)
+                and self.program.addShaderFromSourceCode(QOpenGLShader.Fragment, FRAGMENT_SHADER)
+                and self.program.link()):
+            self.failed.emit(self.program.log())
+            self.program = None
+            return
+
+        vertices = _vertex_data()
+        self.vbo = QOpenGLBuffer(QOpenGLBuffer.VertexBuffer)
+        self.vbo.create()
+        self.vbo.bind()
+        self.vbo.allocate(vertices.tobytes(), vertices.nbytes)
+        self.vbo.release()
+
+        # 坐标轴端点和颜色是固定的，只上传一次
+        self.program.bind()
+        self.program.setUniformValueArray(self.program.uniformLocation(f'joints[{N_JOINTS}]'),
+                                          [QVector3D(*p) for p in AXES_POINTS])
+        self.program.setUniformValueArray(self.program.uniformLocation(f'colors[{N_BONES}]'),
+                                          [QVector4D(*(np.array(c + (255,)) / 255)) for c in AXIS_COLORS] + [QVector4D(1, 0, 0, 1)])
+        self.program.release()
+
+        self.gl.glEnable(GL_BLEND)
+        self.gl.glBlendFunc(GL_SRC_ALPHA, GL_ONE_MINUS_SRC_ALPHA)
+        self.gl.glEnable(GL_VERTEX_PROGRAM_POINT_SIZE)
+        self.gl.glEnable(GL_POINT_SPRITE)
+
+    def paintGL(self):
+        if self.program is None:
+            return
+        gl = self.gl
+        gl.glClearColor(*self.background)
+        gl.glClear(GL_COLOR_BUFFER_BIT)
+        if self.pose_source is not None:
+            pose = self.pose_source()
+            if pose is not None:
+                with instrumentation.span('render'):
+                    self._upload_pose(*pose)  # 绘制过程中不能再调用 update，否则会不停重绘
+        if self.keypoints is None:
+            return
+        start = time.perf_counter()
+        # 绘制区域按 size 映射到整个控件，需要按实际像素缩放线宽和点大小
+        scale = self.width() * self.devicePixelRatioF() / self.size
+
+        self.program.bind()
+        self.vbo.bind()
+        for name in ('joint', 'bone'):
+            location = self.program.attributeLocation(name)
+            self.program.enableAttributeArray(location)
+            self.program.setAttributeBuffer(location, GL_FLOAT, 4 * ('joint', 'bone').index(name), 1, 8)
+        self.program.setUniformValueArray('joints', self.keypoints)
+        self.program.setUniformValueArray('colors', self.colors)
+
+        self.program.setUniformValue('transform', self.skeleton_transform)
+        self.program.setUniformValue('point_size', float((2 * self.point_radius + 1) * scale))
+        self.program.setUniformValue('round_points', 1.0)
+        gl.glDrawArrays(GL_POINTS, 2 * N_BONES, N_JOINTS)
+        self.program.setUniformValue('round_points', 0.0)
+        gl.glLineWidth(self.line_width * scale)
+        gl.glDrawArrays(GL_LINES, 0, 2 * N_BONES)
+        self.program.setUniformValue('transform', self.axes_transform)
+        gl.glDrawArrays(GL_LINES, 2 * N_BONES + N_JOINTS, 2 * len(AXIS_COLORS))
+
+        self.vbo.release()
+        self.program.release()
+        instrumentation.record('paint', start)
+        instrumentation.finish('end_to_end')
@@ -0,0 +1,121 @@
+"""根据实测延迟自动调整姿态估计的开销
+
+InferenceThread 每处理完一帧把端到端延迟（采集 -> 结果发出）交给 AdaptiveController，
+控制器在一组从高画质到低开销排列的档位之间切换，使延迟保持在 target_ms 附近：
+    scale             送入模型前把图像（或人体区域）缩小到的比例
+    roi               只把上一次检测到的人体区域（加边距）送入模型
+    skip              每 skip 帧做一次推理，其余帧用滤波器的速度外推姿势
+    model_complexity  mediapipe Pose 的模型大小（0 最轻）
+超过目标时立即降一档，低于目标的 low_ratio 倍并持续 recover_frames 帧才升一档，避免来回跳。
+"""
+from collections import namedtuple
+
+import numpy as np
+
+InferenceSettings = namedtuple('InferenceSettings', ['scale', 'roi', 'skip', 'model_complexity'])
+
+DEFAULT_LEVELS = (
+    InferenceSettings(1.0, False, 1, 1),
+    InferenceSettings(1.0, True, 1, 1),
+    InferenceSettings(0.75, True, 1, 1),
+    InferenceSettings(0.5, True, 1, 1),
+    InferenceSettings(0.5, True, 1, 0),
+    InferenceSettings(0.5, True, 2, 0),
+    InferenceSettings(0.375, True, 2, 0),
+    InferenceSettings(0.375, True, 3, 0),
+)
+
+
+class AdaptiveController:
+    def __init__(self, target_ms=60., levels=DEFAULT_LEVELS, level=0, smoothing=0.2, high_ratio=1.0,
+                 low_ratio=0.6, recover_frames=60, cooldown_frames=15):
+        self.target_ms = target_ms
+        self.levels = levels
+        self.level = level
+        self.smoothing = smoothing  # 延迟的指数滑动平均系数
+        self.high_ratio = high_ratio
+        self.low_ratio = low_ratio
+        self.recover_frames = recover_frames
+        self.cooldown_frames = cooldown_frames  # 换档后等这么多帧再判断，让滑动平均跟上新档位
+        self.latency_ms = None
+        self._fast_frames = 0
+        self._cooldown = 0
+
+    @property
+    def settings(self) -> InferenceSettings:
+        return self.levels[self.level]
+
+    def record(self, latency_ms):
+        """记录一帧的端到端延迟，档位变化时返回 True"""
+        if self.latency_ms is None:
+            self.latency_ms = latency_ms
+        else:
+            self.latency_ms += self.smoothing * (latency_ms - self.latency_ms)
+        if self._cooldown:
+            self._cooldown -= 1
+            return False
+
+        if self.latency_ms > self.target_ms * self.high_ratio and self.level < len(self.levels) - 1:
+            return self._set_level(self.level + 1)
+        if self.latency_ms < self.target_ms * self.low_ratio and self.level > 0:
+            self._fast_frames += 1
+            if self._fast_frames >= self.recover_frames:
+                return self._set_level(self.level - 1)
+        else:
+            self._fast_frames = 0
+        return False
+
+    def _set_level(self, level):
+        self.level = level
+        self._fast_frames = 0
+        self._cooldown = self.cooldown_frames
+        return True
+
+    def describe(self):
+        s = self.settings
+        latency = f'{self.latency_ms:.0f}' if self.latency_ms is not None else '-'
+        return (f'level {self.level}: scale {s.scale:g}, roi {"on" if s.roi else "off"}, every {s.skip} frame(s), '
+                f'model {s.model_complexity}, latency {latency}/{self.target_ms:.0f} ms')
+
+
+def body_roi(landmarks, visibility, shape, margin=0.25, min_visibility=0.5, min_size=0.3):
+    """上一次检测到的人体（归一化坐标）外扩 margin 后的像素区域 (x0, y0, x1, y1)，可见的点太少时返回 None"""
+    visible = visibility >= min_visibility
+    if visible.sum() < 4:
+        return None
+    h, w = shape[:2]
+    xy = landmarks[visible, :2]
+    (x0, y0), (x1, y1) = xy.min(axis=0), xy.max(axis=0)
+    # 外扩并保证不小于 min_size，动作幅度突然变大时人不会出框
+    half_w = max((x1 - x0) * (0.5 + margin), min_size / 2)
+    half_h = max((y1 - y0) * (0.5 + margin), min_size / 2)
+    cx, cy = (x0 + x1) / 2, (y0 + y1) / 2
+    x0, x1 = int(max(cx - half_w, 0) * w), int(np.ceil(min(cx + half_w, 1) * w))
+    y0, y1 = int(max(cy - half_h, 0) * h), int(np.ceil(min(cy + half_h, 1) * h))
+    if x1 - x0 < 16 or y1 - y0 < 16:
+        return None
+    return x0, y0, x1, y1
+
+
+def update_roi(roi, landmarks, visibility, shape, inner_margin=0.1, min_visibility=0.5):
+    """人还在当前区域内（离边缘超过 inner_margin）时保持区域不变，mediapipe 的跟踪依赖前后帧输入一致"""
+    if roi is not None:
+        h, w = shape[:2]
+        x0, y0, x1, y1 = roi
+        dx, dy = (x1 - x0) * inner_margin, (y1 - y0) * inner_margin
+        xy = landmarks[visibility >= min_visibility, :2] * (w, h)
+        if len(xy) >= 4 and np.all((xy >= (x0 + dx, y0 + dy)) & (xy <= (x1 - dx, y1 - dy))):
+            return roi
+    return body_roi(landmarks, visibility, shape, min_visibility=min_visibility)
+
+
+def to_full_frame(landmarks, roi, shape):
+    """ROI 内的归一化坐标 -> 整幅图像的归一化坐标，原地修改 (33, 3) 数组；z 与 x 同尺度"""
+    if roi is None:
+        return landmarks
+    h, w = shape[:2]
+    x0, y0, x1, y1 = roi
+    landmarks[:, 0] = (landmarks[:, 0] * (x1 - x0) + x0) / w
+    landmarks[:, 1] = (landmarks[:, 1] * (y1 - y0) + y0) / h
+    landmarks[:, 2] *= (x1 - x0) / w
+    return landmarks
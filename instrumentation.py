@@ -0,0 +1,193 @@
+"""各阶段耗时的埋点：从 camera.read() 到带颜色的骨架画到 Player 上，时间花在了哪里
+
+默认关闭，span() 返回共享的空上下文管理器，record() 等函数直接返回，开销只有一次函数调用。
+环境变量 SMARTFIT_PROFILE=1 时打开：最近 capacity 条记录存进预分配的环形缓冲区，
+TransparentWindow 左上角显示各阶段最近若干次的统计，退出时导出到 SMARTFIT_PROFILE_OUT（.csv 或 .json，默认 profile.csv）。
+
+阶段：
+    capture     读一帧（CaptureThread）
+    queue       帧在队列里等待推理线程
+    inference   姿态估计（隔帧推理时为外推）
+    landmarks   平滑 + 骨骼向量转换
+    delivery    信号从推理线程送到 GUI 线程
+    alignment   整体旋转到参考帧的坐标系
+    scoring     DTW 打分
+    render      Player 把骨架画进 QImage（OpenGL 时为上传顶点）
+    paint       Player 绘制到屏幕
+    end_to_end  开始读帧 -> 这一帧的骨骼颜色画到屏幕上
+推理线程里的阶段由 detections_updated 附带的 stamps 在 GUI 线程补记（record_stamps），热路径上不加锁。
+"""
+import atexit
+import csv
+import json
+import os
+import threading
+import time
+
+import numpy as np
+
+# 阶段名、起点、终点，后两者为 InferenceThread 发出的 stamps 中的键；received 为 GUI 线程收到的时刻
+PIPELINE_STAGES = (
+    ('capture', 'read', 'captured'),
+    ('queue', 'captured', 'dequeued'),
+    ('inference', 'dequeued', 'inferred'),
+    ('landmarks', 'inferred', 'emitted'),
+    ('delivery', 'emitted', 'received'),
+)
+
+ENABLED = os.environ.get('SMARTFIT_PROFILE', '') not in ('', '0')
+OUTPUT = os.environ.get('SMARTFIT_PROFILE_OUT', 'profile.csv')
+
+
+class Timeline:
+    """定长环形缓冲区，记录 (阶段, 开始时刻, 耗时)，时刻均为 perf_counter 秒"""
+
+    def __init__(self, capacity=4096):
+        self.capacity = capacity
+        self.names = []
+        self._ids = {}
+        self.name_ids = np.zeros(capacity, dtype=np.int16)
+        self.starts = np.zeros(capacity)
+        self.durations = np.zeros(capacity)
+        self.count = 0  # 累计记录数
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def record(self, name, start, end):
+        with self._lock:
+            i = self._ids.get(name)
+            if i is None:
+                i = self._ids[name] = len(self.names)
+                self.names.append(name)
+            k = self.count % self.capacity
+            self.name_ids[k] = i
+            self.starts[k] = start
+            self.durations[k] = end - start
+            self.count += 1
+
+    def entries(self):
+        """按时间先后排列的 (阶段编号, 开始时刻, 耗时)"""
+        with self._lock:
+            n, end = len(self), self.count % self.capacity
+            order = np.arange(end - n, end) % self.capacity
+            return self.name_ids[order], self.starts[order], self.durations[order]
+
+    def summary(self, last=120):
+        """每个阶段最近 last 次的 {阶段: (次数, p50, p95, max)}，单位毫秒，按首次出现的顺序排列"""
+        ids, _, durations = self.entries()
+        result = {}
+        for i, name in enumerate(self.names):
+            d = durations[ids == i][-last:] * 1000
+            if len(d):
+                p50, p95 = np.percentile(d, (50, 95))
+                result[name] = (len(d), float(p50), float(p95), float(d.max()))
+        return result
+
+    def dump(self, path):
+        ids, starts, durations = self.entries()
+        origin = starts.min() if len(starts) else 0.
+        rows = [(self.names[i], (s - origin) * 1000, d * 1000) for i, s, d in zip(ids, starts, durations)]
+        if os.path.splitext(path)[1].lower() == '.json':
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump({'spans': [{'name': n, 'start_ms': s, 'duration_ms': d} for n, s, d in rows],
+                           'summary': {name: dict(zip(('count', 'p50_ms', 'p95_ms', 'max_ms'), v))
+                                       for name, v in self.summary(self.capacity).items()}}, f, indent=1)
+        else:
+            with open(path, 'w', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                writer.writerow(('name', 'start_ms', 'duration_ms'))
+                writer.writerows((n, f'{s:.3f}', f'{d:.3f}') for n, s, d in rows)
+
+
+timeline = Timeline() if ENABLED else None
+_pending = {}
+
+
+class _Span:
+    __slots__ = ('name', 'start')
+
+    def __init__(self, name):
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        timeline.record(self.name, self.start, time.perf_counter())
+        return False
+
+
+class _NullSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        return False
+
+
+_NULL_SPAN = _NullSpan()
+
+
+def enable(capacity=4096):
+    """不设置环境变量时手动打开（如基准测试），不会在退出时导出"""
+    global ENABLED, timeline
+    ENABLED = True
+    timeline = Timeline(capacity)
+
+
+def span(name):
+    """with span('scoring'): ..."""
+    return _Span(name) if ENABLED else _NULL_SPAN
+
+
+def record(name, start, end=None):
+    if ENABLED:
+        timeline.record(name, start, time.perf_counter() if end is None else end)
+
+
+def record_stamps(stamps, received=None):
+    """在 GUI 线程补记推理线程里各阶段的耗时"""
+    if not ENABLED:
+        return
+    stamps = dict(stamps, received=time.perf_counter() if received is None else received)
+    for name, begin, end in PIPELINE_STAGES:
+        if begin in stamps and end in stamps:
+            timeline.record(name, stamps[begin], stamps[end])
+
+
+def mark(name, start):
+    """跨越多个调用的阶段：记下开始时刻，之后 finish(name) 时记录（同名的旧标记被覆盖）"""
+    if ENABLED:
+        _pending[name] = start
+
+
+def finish(name):
+    if ENABLED:
+        start = _pending.pop(name, None)
+        if start is not None:
+            timeline.record(name, start, time.perf_counter())
+
+
+def format_summary(last=120):
+    if not ENABLED:
+        return ''
+    lines = [f'{"stage":<11s}{"p50":>7s}{"p95":>7s}{"max":>7s} ms']
+    for name, (_, p50, p95, peak) in timeline.summary(last).items():
+        lines.append(f'{name:<11s}{p50:>7.2f}{p95:>7.2f}{peak:>7.2f}')
+    return '\n'.join(lines)
+
+
+def dump(path=None):
+    if ENABLED and len(timeline):
+        path = path or OUTPUT
+        timeline.dump(path)
+        print(f'profile: {len(timeline)} spans written to {path}')
+
+
+if ENABLED:
+    atexit.register(dump)
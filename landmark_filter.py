@@ -0,0 +1,131 @@
+"""实时关键点的平滑和离群值剔除
+
+OneEuroFilter：每个坐标一个 One-Euro 低通滤波器（Casiez 等，CHI 2012），静止时截止频率低、抖动小，
+快速运动时截止频率随速度升高、滞后小。所有状态都是预先分配的数组，每帧只做固定次数的原地 numpy 运算。
+LandmarkFilter 在它外面加上：
+    可见度门限：可见度低的关键点保持上一次的滤波结果，不跟着乱跳
+    离群值剔除：单帧位移超过 max_jump 的关键点视为误检，连续 outlier_patience 帧都这样才接受
+    短暂丢失：没检测到人体时沿用上一次的姿势，超过 max_dropout 秒才清空
+"""
+import numpy as np
+
+
+class OneEuroFilter:
+    """min_cutoff（Hz）控制静止时的平滑程度，beta 控制截止频率随速度（坐标单位/秒）升高的快慢"""
+
+    def __init__(self, shape=(33, 3), min_cutoff=2.0, beta=60.0, d_cutoff=2.0):
+        self.min_cutoff = min_cutoff
+        self.beta = beta
+        self.d_cutoff = d_cutoff
+        self.value = np.zeros(shape)
+        self.derivative = np.zeros(shape)
+        self._delta = np.zeros(shape)
+        self._alpha = np.zeros(shape)
+        self.t = None
+
+    def reset(self):
+        self.t = None
+
+    @staticmethod
+    def _smoothing(cutoff, dt):
+        r = 2 * np.pi * cutoff * dt
+        return r / (r + 1)
+
+    def __call__(self, x, t, gate=None):
+        """gate 与 x 可广播，为 0 的位置保持上一次的结果。返回内部数组 value，调用方需要保留时应复制"""
+        if self.t is None:
+            self.value[...] = x
+            self.derivative.fill(0.)
+            self.t = t
+            return self.value
+        dt = t - self.t
+        if dt <= 0:
+            return self.value
+        self.t = t
+
+        delta, alpha = self._delta, self._alpha
+        # 速度的低通滤波
+        np.subtract(x, self.value, out=delta)
+        if gate is not None:
+            delta *= gate
+        delta *= 1 / dt
+        delta -= self.derivative
+        delta *= self._smoothing(self.d_cutoff, dt)
+        self.derivative += delta
+        # 截止频率随速度升高：alpha = r / (r + 1)，r = 2π·cutoff·dt
+        np.abs(self.derivative, out=alpha)
+        alpha *= self.beta
+        alpha += self.min_cutoff
+        alpha *= 2 * np.pi * dt
+        np.divide(alpha, alpha + 1, out=alpha)
+        if gate is not None:
+            alpha *= gate
+        np.subtract(x, self.value, out=delta)
+        delta *= alpha
+        self.value += delta
+        return self.value
+
+
+class LandmarkFilter:
+    # 默认参数按 benchmarks/landmark_smoothing 调整：抖动和相对真实轨迹的误差都要低于原始检测结果
+    def __init__(self, n_landmarks=33, min_cutoff=2.0, beta=60.0, d_cutoff=2.0, min_visibility=0.5,
+                 max_jump=0.25, outlier_patience=3, max_dropout=0.5):
+        self.filter = OneEuroFilter((n_landmarks, 3), min_cutoff, beta, d_cutoff)
+        self.min_visibility = min_visibility
+        self.max_jump = max_jump  # 归一化图像坐标
+        self.outlier_patience = outlier_patience
+        self.max_dropout = max_dropout  # 秒
+        self.last_seen = None
+        self._gate = np.zeros((n_landmarks, 1))
+        self._jump = np.zeros(n_landmarks)
+        self._outliers = np.zeros(n_landmarks, dtype=np.int32)
+        self._accept = np.zeros(n_landmarks, dtype=bool)
+        self._persistent = np.zeros(n_landmarks, dtype=bool)
+        self._diff = np.zeros((n_landmarks, 3))
+        self._predicted = np.zeros((n_landmarks, 3))
+
+    def reset(self):
+        self.filter.reset()
+        self.last_seen = None
+        self._outliers.fill(0)
+
+    def predict(self, t):
+        """按滤波器估计的速度把上一次的姿势外推到 t 时刻（跳过推理的帧使用），没有可用姿势时返回 None"""
+        if self.filter.t is None:
+            return None
+        np.multiply(self.filter.derivative, t - self.filter.t, out=self._predicted)
+        self._predicted += self.filter.value
+        return self._predicted
+
+    def update(self, landmarks, visibility, t):
+        """landmarks (33, 3) 或 None（本帧没检测到人体），t 为秒。
+
+        返回 (姿势, 是否为沿用的旧姿势)；丢失超过 max_dropout 秒时返回 (None, False)。
+        返回的姿势是内部数组，调用方需要保留时应复制。
+        """
+        if landmarks is None:
+            if self.last_seen is None or t - self.last_seen > self.max_dropout:
+                self.reset()
+                return None, False
+            return self.filter.value, True
+
+        if self.last_seen is None:
+            self.filter.reset()
+            self._outliers.fill(0)
+        else:
+            # 单帧位移过大视为离群值，持续 outlier_patience 帧才认为是真实运动
+            np.subtract(landmarks, self.filter.value, out=self._diff)
+            np.einsum('ij,ij->i', self._diff, self._diff, out=self._jump)
+            np.greater(self._jump, self.max_jump * self.max_jump, out=self._accept)
+            self._outliers += self._accept
+            self._outliers *= self._accept
+            np.greater_equal(self._outliers, self.outlier_patience, out=self._persistent)
+            np.less(self._outliers, 1, out=self._accept)
+            self._accept |= self._persistent
+        self.last_seen = t
+
+        gate = self._gate[:, 0]
+        np.greater_equal(visibility, self.min_visibility, out=gate, casting='unsafe')
+        if self.filter.t is not None:
+            gate *= self._accept
+        return self.filter(landmarks, t, self._gate), False
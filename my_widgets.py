@@ -14,15 +14,19 @@ from PyQt5.QtWidgets import QPushButton, QSlider, QStyleOptionSlider, QStyle, QL
 from PyQt5 import QtWidgets, QtGui, QtCore
 from glob import glob
 import re
-import mediapipe as mp
 
 import constants as c
-from plot_utils import draw_skeleton, pil_image_to_qpixmap
+import instrumentation
+from plot_utils import SkeletonRenderer
+from gl_skeleton import GLSkeletonView
 from cosine_distance import *
-from test import quaternion_rotate_vector, quaternion_from_axis_angle, quaternion_multiply
-
-mp_drawing = mp.solutions.drawing_utils
-mp_pose = mp.solutions.pose
+from pose_io import frame_at
+from session_library import SessionLibrary, Prefetcher
+from quaternion import Orientation
+from playback_clock import PlaybackClock, PlaybackStats
+from camera_pipeline import FrameQueue, CaptureThread, InferenceThread
+from frame_sources import open_source
+from inference_control import AdaptiveController
 
 
 class MyPushButton(QPushButton):
@@ -611,11 +615,12 @@ class MyProgressBar(QWidget):
 
 
 class Player(QLabel):
-    sync_bar = pyqtSignal(int)
+    sync_bar = pyqtSignal(float)  # 当前播放位置（秒）
     reach_end = pyqtSignal()
     program_changed = pyqtSignal()
+    info = pyqtSignal(str)  # 需要告诉用户的状态，如 OpenGL 不可用
 
-    def __init__(self, root, parent, fps=30.0, geometry=()):
+    def __init__(self, root, parent, fps=30.0, geometry=(), memory_budget=256 * 1024 * 1024, use_opengl=False):
         super().__init__(parent)
         self.mode = c.PLAY_MODE_SEQ
         self.rate = 1.0
@@ -630,44 +635,85 @@ class Player(QLabel):
         self.current_frame = 0
         self.current_file_idx = 0
         self.data = None
+        self.timestamps = None  # 每一帧的时间戳（毫秒）
+        self.detected = None  # 每一帧是否检测到了人体
+        self.bone_arrays = None  # 每一帧的单位骨骼向量，load 时一次性算好
+        self.bone_lengths = None
         self.playing = False
         self.name_label = MyTextLabel(self, font_size=20)
         self.name_label.resize(700, 45)
         self.bone_color = None
-        self.rotation_quaternion = np.array([1, 0, 0, 0])  # Identity quaternion
+        self.renderer = SkeletonRenderer()  # 骨架直接画在复用的 QImage 上，在 paintEvent 中绘制
+        self.gl_view = None  # 启用 OpenGL 时由 GPU 绘制，失败则退回 renderer
+        if use_opengl:
+            self.gl_view = GLSkeletonView(self)
+            self.gl_view.setGeometry(self.contentsRect())
+            self.gl_view.lower()
+            self.gl_view.failed.connect(self.disable_opengl)
+            self.gl_view.pose_source = self.take_pending_pose
+        # update_frame 只记录要显示的帧并请求重绘，同一轮事件循环中的多次请求只绘制一次
+        self.pending_frame = None
+        self.normal_vector = np.array([0., 0., 1.])  # 视角，只在旋转变化时重新计算
+        self.orientation = Orientation()  # 原地更新的旋转四元数，定期重新归一化
+        self.renderer.set_view(self.normal_vector)
+        if self.gl_view is not None:
+            self.gl_view.set_view(self.normal_vector)
         self.last_mouse_pos = None
+        self.library = SessionLibrary(memory_budget)  # 最近打开的节目，切换时不必重新读文件
+        self.prefetcher = Prefetcher(self.library)  # 后台预读下一个节目
+        self.next_random = None  # 随机模式下提前选好的下一个节目
+        self.clock = PlaybackClock()  # 播放位置由单调时钟决定，定时器只负责定期刷新
+        self.stats = PlaybackStats()  # 跳帧数和实际帧率
 
         self.select_root(root)
         self.load(0, fps=fps)
 
         self.timer = QTimer()
+        self.timer.setTimerType(Qt.PreciseTimer)
         self.timer.timeout.connect(self.frame_forward)
 
         self.reset_button = MyPushButton("Reset", self, geometry=(10, self.height()-35, 45, 30), slot=self.reset_angle)
 
     def reset_angle(self):
-        self.rotation_quaternion = np.array([1, 0, 0, 0])  # Identity quaternion
+        self.orientation.reset()
+        self.update_view()
+
+    def update_view(self):
+        """旋转变化后重新计算视角"""
+        self.normal_vector = self.orientation.apply(np.array([0., 0., 1.]))
+        if self.gl_view is not None:
+            self.gl_view.set_view(self.normal_vector)
+        else:
+            self.renderer.set_view(self.normal_vector)
         self.update_frame()
 
     def set_rate(self, rate: float):
         if rate > 0:
             self.rate = rate
+            self.clock.set_rate(rate)
         if self.playing:
-            self.timer.stop()
-            self.timer.start(int(1000/(self.fps*self.rate)))
+            self.timer.start(self.tick_interval())
+
+    def tick_interval(self):
+        """定时器间隔只影响刷新的及时程度，取整误差不会累积到播放位置上"""
+        return max(1, int(1000 / (self.fps * self.rate)))
 
     def set_bone_color(self, bone_color):
         self.bone_color = bone_color
 
     def set_mode(self, mode):
         self.mode = mode
+        self.prefetch_next()
 
     def start(self):
-        self.timer.start(int(1000/(self.fps*self.rate)))
+        self.clock.set_rate(self.rate)
+        self.clock.start(self.timestamps[self.current_frame] if self.frames else 0.)
+        self.timer.start(self.tick_interval())
         self.playing = True
 
     def pause(self):
         self.timer.stop()
+        self.clock.stop()
         self.playing = False
 
     def mousePressEvent(self, event):
@@ -682,12 +728,10 @@ class Player(QLabel):
             # 从用户视角调整视角
             horizontal_axis = np.array([0, 1, 0])
             vertical_axis = np.array([1, 0, 0])
-            yaw_quaternion = quaternion_from_axis_angle(horizontal_axis, np.deg2rad(dx * 0.5))
-            pitch_quaternion = quaternion_from_axis_angle(vertical_axis, np.deg2rad(dy * 0.5))
             # 更新旋转四元数
-            self.rotation_quaternion = quaternion_multiply(self.rotation_quaternion, yaw_quaternion)
-            self.rotation_quaternion = quaternion_multiply(self.rotation_quaternion, pitch_quaternion)
-            self.update_frame()
+            self.orientation.rotate(horizontal_axis, np.deg2rad(dx * 0.5))
+            self.orientation.rotate(vertical_axis, np.deg2rad(dy * 0.5))
+            self.update_view()
             self.last_mouse_pos = event.pos()
 
     def mouseReleaseEvent(self, event):
@@ -702,25 +746,70 @@ class Player(QLabel):
             return False
         elif i == self.frames:
             i -= 1
-        normal_vector = quaternion_rotate_vector(self.rotation_quaternion, np.array([0, 0, 1]))
-        img = draw_skeleton(self.data[i], normal_vector, bone_color=self.bone_color)
-        self.setPixmap(QPixmap(pil_image_to_qpixmap(img)))
+        self.pending_frame = i
+        if self.gl_view is not None:
+            self.gl_view.update()
+        else:
+            self.update()
         return True
 
+    def take_pending_pose(self):
+        """绘制前取出待绘制的帧（没有新请求时返回 None）"""
+        if self.pending_frame is None or self.data is None:
+            return None
+        i, self.pending_frame = self.pending_frame, None
+        return self.data[i], self.bone_color
+
+    def disable_opengl(self, reason: str = ''):
+        if self.gl_view is None:
+            return
+        self.info.emit(f'OpenGL 不可用，改用 CPU 绘制：{reason}')
+        self.gl_view.hide()
+        self.gl_view.deleteLater()
+        self.gl_view = None
+        self.renderer.set_view(self.normal_vector)
+        self.update_frame()
+
+    def paintEvent(self, event):
+        super().paintEvent(event)  # 边框
+        if self.gl_view is None:
+            pose = self.take_pending_pose()
+            if pose is not None:
+                with instrumentation.span('render'):
+                    self.renderer.render(pose[0], bone_color=pose[1])
+            with instrumentation.span('paint'):
+                painter = QPainter(self)
+                painter.setRenderHint(QPainter.SmoothPixmapTransform)
+                painter.drawImage(self.contentsRect(), self.renderer.image)
+            instrumentation.finish('end_to_end')
+
+    def resizeEvent(self, event):
+        super().resizeEvent(event)
+        if self.gl_view is not None:
+            self.gl_view.setGeometry(self.contentsRect())
+
     def frame_forward(self):
-        if self.current_frame < self.frames:
-            self.sync_bar.emit(self.current_frame)
-            self.update_frame()
-            self.current_frame += 1
-        else:
+        """显示时钟当前位置对应的帧，来不及显示的帧直接跳过"""
+        position = self.clock.position()
+        if position >= self.duration() * 1000:
             self.timer.stop()
+            self.clock.stop()
             self.playing = False  # 播放停止
             self.reach_end.emit()
+            return
+        i = frame_at(self.timestamps, position)
+        self.sync_bar.emit(position / 1000)
+        if i == self.current_frame:
+            return
+        self.stats.record(dropped=max(i - self.current_frame - 1, 0))
+        self.current_frame = i
+        self.update_frame()
 
     def set_frame(self, i: int):
         if i >= self.frames:
             return False
         self.current_frame = i
+        self.clock.seek(self.timestamps[i])
         return True
 
     def get_frame(self, i: int = None):
@@ -730,27 +819,76 @@ class Player(QLabel):
             return None
         return self.data[i]
 
+    def get_bone_arrays(self, i: int = None):
+        if i is None:
+            i = self.current_frame
+        if i >= self.frames or not self.detected[i]:
+            return None
+        return self.bone_arrays[i]
+
     def duration(self):
-        return self.frames / self.fps
+        return self.timestamps[-1] / 1000 + 1 / self.fps if self.frames else 0.
+
+    def frame_at(self, t: float):
+        """t 秒时应显示的帧"""
+        return frame_at(self.timestamps, t * 1000)
+
+    def time_of(self, i: int):
+        return self.timestamps[min(i, self.frames - 1)] / 1000 if self.frames else 0.
 
     def load(self, i=0, fps=30., rand=False):
+        if rand:
+            i = self.pick_random()
         if i < 0 or i >= len(self.playing_list):
             return False
-        name = os.path.basename(self.playing_list[i] if not rand else random.choice(self.playing_list))
+        name = os.path.basename(self.playing_list[i])
         self.name_label.update_text(name[:-4])
-        self.fps = fps
         self.current_file_idx = i
         path = os.path.join(self.root, name)
-        if isinstance(name, str) and name.endswith('.npy') and os.path.exists(path):
-            self.data = np.load(path)
-            self.frames = self.data.shape[0]
-        else:
-            raise FileNotFoundError(f'file not found at path {path}')
+        session = self.prefetcher.open(path, fps)  # 内存映射打开，只有用到的帧才会被读入
+        self.data = session.landmarks
+        self.timestamps = session.timestamps
+        self.detected = session.detected
+        self.fps = session.fps
+        self.frames = self.data.shape[0]
+        self.bone_arrays, self.bone_lengths = session.bone_arrays, session.bone_lengths
         self.current_frame = 0
+        self.clock.seek(0.)
+        self.stats.reset()
         self.update_frame()
         self.program_changed.emit()  # 一定在把所有自身属性更新之后发射信号（小心处理与其他线程的耦合）
+        self.prefetch_next()
         return True
 
+    def shutdown(self):
+        """退出前停止播放和后台预读"""
+        self.pause()
+        self.prefetcher.shutdown()
+
+    def pick_random(self):
+        i = self.next_random if self.next_random is not None else random.randrange(len(self.playing_list))
+        self.next_random = None
+        return i
+
+    def predict_next(self):
+        """next() 将要加载的节目下标，没有则返回 None"""
+        if self.mode == c.PLAY_MODE_SEQ:
+            i = self.current_file_idx + 1
+        elif self.mode == c.PLAY_MODE_CYCLE:
+            i = self.current_file_idx
+        elif self.mode == c.PLAY_MODE_RANDOM:
+            if self.next_random is None and self.playing_list:
+                self.next_random = random.randrange(len(self.playing_list))
+            i = self.next_random
+        else:
+            return None
+        return i if i is not None and 0 <= i < len(self.playing_list) else None
+
+    def prefetch_next(self):
+        i = self.predict_next()
+        if i is not None:
+            self.prefetcher.prefetch(os.path.join(self.root, os.path.basename(self.playing_list[i])))
+
     def select_root(self, root):
         self.root = root
         lst = glob(f'{root}/*.npy')
@@ -848,10 +986,10 @@ class OpenCameraThread(QThread):
         self.camera_window = camera_window
 
     def run(self):
-        self.camera_window.camera = cv2.VideoCapture(0)
+        self.camera_window.camera = open_source(self.camera_window.source, realtime=True)
         if self.camera_window.camera.isOpened():
-            _, frame = self.camera_window.camera.read()
-            height, width, _ = frame.shape
+            # 不读帧，视频文件和关键点流从第一帧开始回放；关键点流没有图像，窗口保持默认大小
+            width, height = self.camera_window.camera.frame_size() or (640, 480)
             self.camera_window.setFixedSize(width, height)
             self.camera_window.label.setGeometry(0, 0, width, height)
             self.camera_opened.emit()
@@ -859,25 +997,58 @@ class OpenCameraThread(QThread):
             self.camera_window.camera_open_failure.emit()
 
 
-def add_annotation(results, image):
-    ret = False
-    if results.pose_landmarks:
-        color = (0, 255, 0)
-        ret = True
-        for idx, lm in enumerate(results.pose_landmarks.landmark):
-            # x = lm.x * image.shape[1]
-            # y = lm.y * image.shape[0]
-            # z = lm.z * image.shape[1]
-            visibility = lm.visibility  # 获取可见性
-            # 根据可见性设置不同的颜色
-            if visibility < 0.5:
-                color = (0, 0, 255)  # 红色，表示不可见
-                ret = False
-        mp_drawing.draw_landmarks(
-            image, results.pose_landmarks, mp_pose.POSE_CONNECTIONS,
-            landmark_drawing_spec=mp_drawing.DrawingSpec(color=color, thickness=2, circle_radius=2),
-            connection_drawing_spec=mp_drawing.DrawingSpec(color=color, thickness=2))
-    return ret
+class PoseSearchThread(QThread):
+    """在后台更新姿势索引并查询，结果（pose_index.Match 列表）通过 matches_found 发回 GUI 线程"""
+    matches_found = pyqtSignal(list)
+
+    def __init__(self):
+        super().__init__()
+        self.pose_index = None  # 第一次搜索时建立/更新，之后复用
+        self.root = None
+        self.pose = None
+        self.k = 5
+
+    def search(self, root, pose, k=5):
+        """上一次搜索还没完成时返回 False"""
+        if self.isRunning():
+            return False
+        self.root, self.pose, self.k = root, pose, k
+        self.start()
+        return True
+
+    def run(self):
+        from pose_index import PoseIndex  # sklearn（连带 scipy）只在第一次搜索时导入，不拖慢启动
+        if self.pose_index is None or self.pose_index.root != self.root:
+            self.pose_index = PoseIndex(self.root)
+        self.pose_index.update()
+        self.matches_found.emit(self.pose_index.query(self.pose, k=self.k))
+
+
+class FrameView(QLabel):
+    """直接在 paintEvent 里绘制推理线程发来的 QImage，不经过 QPixmap，也不拷贝
+
+    只保留最新一帧的引用，InferenceThread 的 ImageRing 才能复用其余的图像
+    """
+
+    def __init__(self, parent=None):
+        super().__init__(parent)
+        self.image = None
+
+    def set_image(self, image: QImage):
+        self.image = image
+        self.update()
+
+    def clear(self):
+        self.image = None
+        super().clear()
+        self.update()
+
+    def paintEvent(self, event):
+        super().paintEvent(event)  # 背景色
+        if self.image is not None:
+            painter = QPainter(self)
+            painter.drawImage(self.rect(), self.image)
+            painter.end()
 
 
 class CameraWindow(QWidget):
@@ -887,19 +1058,25 @@ class CameraWindow(QWidget):
 
     def __init__(self, *args, **kwargs):
         super().__init__(*args, **kwargs)
-        self.pose = None
-        self.frame = None
         # Remove window frame
         self.setWindowFlags(Qt.FramelessWindowHint | Qt.WindowStaysOnTopHint)
 
         # Initialize camera
+        # 帧源：摄像头编号，或用环境变量 SMARTFIT_FRAME_SOURCE 指定视频文件 / 关键点 .npy 代替摄像头
+        self.source = os.environ.get('SMARTFIT_FRAME_SOURCE', 0)
         self.camera = None
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.update_frame)
         self.fps = 30
+        # 采集线程 -> 推理线程 -> GUI，队列只保留最新一帧
+        self.frame_queue = FrameQueue(maxsize=1)
+        self.capture_thread = None
+        self.inference_thread = None
+        # 推理开销随实测延迟自动调整，目标为采集到结果发出不超过 target_delay_ms
+        self.target_delay_ms = 60.
+        self.inference_controller = AdaptiveController(self.target_delay_ms)
+        self.inference_settings = self.inference_controller.settings  # 当前选择的推理设置
 
         # Initialize window content
-        self.label = QLabel(self)
+        self.label = FrameView(self)
         self.label.setGeometry(0, 0, self.width(), self.height())
         self.label.setStyleSheet("background-color: gray;")
         self.close_button = CameraExitButton('', self, geometry=(self.width()-36, 0, 25, 25), icon='close', icon_size=(24, 24), slot=self.close)
@@ -923,45 +1100,55 @@ class CameraWindow(QWidget):
 
     def open_camera(self):
         self.open_camera_thread = OpenCameraThread(self)
-        self.open_camera_thread.camera_opened.connect(self.start_timer)
+        self.open_camera_thread.camera_opened.connect(self.start_pipeline)
         self.open_camera_thread.start()
-        self.pose = mp_pose.Pose(min_detection_confidence=0.5, min_tracking_confidence=0.5)
 
     def close_camera(self):
+        self.stop_pipeline()
         if self.camera is not None and self.camera.isOpened():
             self.camera.release()
             self.label.clear()
             self.label.setStyleSheet("background-color: gray;")
-            self.pose.close()
 
-    def start_timer(self):
-        self.timer.start(1000 // self.fps)
+    def start_pipeline(self):
+        self.stop_pipeline()
+        self.frame_queue.clear()
+        self.capture_thread = CaptureThread(self.camera, self.frame_queue)
+        self.inference_controller.target_ms = self.target_delay_ms
+        self.inference_thread = InferenceThread(self.frame_queue, controller=self.inference_controller)
+        self.inference_thread.settings_changed.connect(self.on_settings_changed)
+        self.inference_thread.detections_updated.connect(self.detections_updated)
+        self.inference_thread.annotated.connect(self.on_annotated)
+        self.inference_thread.frame_ready.connect(self.update_frame)
+        self.inference_thread.start()
+        self.capture_thread.start()
+
+    def stop_pipeline(self):
+        for thread in (self.capture_thread, self.inference_thread):
+            if thread is not None:
+                thread.requestInterruption()
+                thread.wait()
+        self.capture_thread = None
+        self.inference_thread = None
+
+    def on_settings_changed(self, settings):
+        self.inference_settings = settings  # 档位由 app.py 的性能叠加层（SMARTFIT_PROFILE=1）显示
+
+    def on_annotated(self, retval: bool):
+        if not retval:
+            self.unrecognized_cnt += 1
+        else:
+            self.send_info("")  # info clear
+            self.unrecognized_cnt = 0
+            self.detected = True
+
+        if self.unrecognized_cnt > 1*self.fps:
+            self.send_info("请全身站在摄像头范围内")
+            self.detected = False
 
-    def update_frame(self):
+    def update_frame(self, qimage: QImage):
         if self.camera is not None and self.camera.isOpened():
-            ret, frame = self.camera.read()
-            if ret:
-                frame = cv2.flip(frame, 1)
-                results = self.pose.process(frame)
-                retval = add_annotation(results, frame)
-                if results.pose_landmarks:
-                    self.detections_updated.emit({'bone_arrays': landmarks_to_bone_arrays(results.pose_landmarks), 'landmarks': landmarks_to_numpy(results.pose_landmarks)})
-                if not retval:
-                    self.unrecognized_cnt += 1
-                else:
-                    self.send_info("")  # info clear
-                    self.unrecognized_cnt = 0
-                    self.detected = True
-
-                if self.unrecognized_cnt > 1*self.fps:
-                    self.send_info("请全身站在摄像头范围内")
-                    self.detected = False
-                frame = cv2.cvtColor(frame, cv2.COLOR_BGR2RGB)
-
-                self.frame = frame
-                qimage = QImage(frame.data, frame.shape[1], frame.shape[0], QImage.Format_RGB888)
-                pixmap = QPixmap.fromImage(qimage)
-                self.label.setPixmap(pixmap)
+            self.label.set_image(qimage)
 
     def mousePressEvent(self, event):
         if event.button() == Qt.LeftButton:
@@ -0,0 +1,77 @@
+"""按单调时钟推进的播放进度
+
+播放位置 = 起点 + 实际经过的时间 × 倍速，与定时器是否准时无关：
+绘制或打分偏慢时跳过来不及显示的帧，而不是整体放慢；毫秒取整也不会让 1.25、1.5 倍速产生累积误差。
+"""
+import time
+from collections import deque
+
+
+class PlaybackClock:
+    def __init__(self, clock=time.perf_counter):
+        self.clock = clock
+        self.rate = 1.0
+        self.running = False
+        self._origin = 0.  # 开始计时时的播放位置（毫秒）
+        self._anchor = 0.  # 开始计时时的时钟读数（秒）
+
+    def start(self, position_ms=None):
+        if position_ms is None:
+            position_ms = self.position()
+        self._origin = position_ms
+        self._anchor = self.clock()
+        self.running = True
+
+    def seek(self, position_ms):
+        """跳到指定位置，不改变是否在计时"""
+        self._origin = position_ms
+        self._anchor = self.clock()
+
+    def stop(self):
+        self._origin = self.position()
+        self.running = False
+
+    def set_rate(self, rate):
+        """从当前位置开始按新倍速计时"""
+        position = self.position()
+        self.rate = rate
+        self._origin = position
+        self._anchor = self.clock()
+
+    def position(self):
+        """当前播放位置（毫秒）"""
+        if not self.running:
+            return self._origin
+        return self._origin + (self.clock() - self._anchor) * 1000. * self.rate
+
+
+class PlaybackStats:
+    """显示帧数、跳过的帧数和最近 window 秒内实际达到的帧率"""
+
+    def __init__(self, window=1.0, clock=time.perf_counter):
+        self.window = window
+        self.clock = clock
+        self.shown = 0
+        self.dropped = 0
+        self._times = deque()
+
+    def reset(self):
+        self.shown = 0
+        self.dropped = 0
+        self._times.clear()
+
+    def record(self, dropped=0):
+        now = self.clock()
+        self.shown += 1
+        self.dropped += dropped
+        self._times.append(now)
+        while now - self._times[0] > self.window:
+            self._times.popleft()
+
+    def fps(self):
+        if len(self._times) < 2:
+            return 0.
+        return (len(self._times) - 1) / (self._times[-1] - self._times[0])
+
+    def __str__(self):
+        return f'{self.fps():.1f} fps, {self.shown} shown, {self.dropped} dropped'
@@ -1,6 +1,7 @@
 import numpy as np
 from PIL import Image, ImageDraw
-from PyQt5.QtGui import QImage, QPixmap
+from PyQt5.QtCore import Qt, QLineF, QRectF
+from PyQt5.QtGui import QImage, QPixmap, QPainter, QColor, QPen
 
 from detect_utils import connections
 
@@ -95,6 +96,88 @@ def draw_skeleton(keypoints, normal_vector=(0, 1, 1), point_radius=3, line_width
     return image
 
 
+AXIS_COLORS = [(0, 0, 255), (0, 255, 0), (255, 0, 0)]
+
+
+def projection_matrix(normal_vector):
+    normal_vector = np.asarray(normal_vector, dtype=float)
+    normal_vector = normal_vector / np.linalg.norm(normal_vector)
+    return np.identity(3) - np.outer(normal_vector, normal_vector)
+
+
+def project_keypoints(keypoints, normal_vector, size=512):
+    """(..., K, 3) 关键点 -> (..., K, 2) 图像坐标，投影方式与 draw_skeleton 相同"""
+    return np.dot(keypoints, projection_matrix(normal_vector)[:2].T) * size
+
+
+class SkeletonRenderer:
+    """用 QPainter 把骨架直接画到复用的 QImage 上，画面与 draw_skeleton 一致，省去 PIL -> QImage -> QPixmap 的转换"""
+
+    def __init__(self, size=512, point_radius=3, line_width=2):
+        self.size = size
+        self.point_radius = point_radius
+        self.line_width = line_width
+        self.image = QImage(size, size, QImage.Format_ARGB32_Premultiplied)
+        self.image.fill(Qt.transparent)
+        self.axes_points = np.array([[0, 0, 0], [0, 0, 1], [0, 1, 0], [1, 0, 0]])
+        self.default_pen = self._pen((255, 255, 255, 255))
+        self.axis_pens = [self._pen(color) for color in AXIS_COLORS]
+        # 视角相关的量只在视角变化时重新计算
+        self.normal_vector = None
+        self.projection = None
+        self.axes = None
+        self.set_view((0, 1, 1))
+
+    def set_view(self, normal_vector):
+        normal_vector = tuple(np.asarray(normal_vector, dtype=float).tolist())
+        if normal_vector == self.normal_vector:
+            return
+        self.normal_vector = normal_vector
+        self.projection = projection_matrix(normal_vector)[:2].T * self.size
+        self.axes = (np.dot(self.axes_points, self.projection) + self.size * 0.5).tolist()
+
+    def _pen(self, color):
+        pen = QPen(QColor(*color), self.line_width)
+        pen.setCapStyle(Qt.FlatCap)
+        return pen
+
+    def render(self, keypoints, normal_vector=None, bone_color=None) -> QImage:
+        """normal_vector 为 None 时沿用 set_view 设置的视角"""
+        if normal_vector is not None:
+            self.set_view(normal_vector)
+        points = np.dot(keypoints, self.projection).tolist()
+        axes = self.axes
+
+        self.image.fill(Qt.transparent)
+        painter = QPainter(self.image)
+        # 绘制关键点
+        r = self.point_radius
+        painter.setPen(Qt.NoPen)
+        painter.setBrush(QColor(255, 0, 0, 255))
+        for x, y in points:
+            painter.drawEllipse(QRectF(x - r, y - r, 2 * r + 1, 2 * r + 1))
+
+        # 绘制连接线
+        if bone_color is None:
+            painter.setPen(self.default_pen)
+            painter.drawLines([QLineF(*points[start], *points[end]) for start, end in connections])
+        else:
+            # bone_color 可以是 RGBA 元组的列表，也可以是 scoring 给出的 QRgb (uint32) 数组
+            packed = isinstance(bone_color, np.ndarray) and bone_color.ndim == 1
+            pen = self._pen((255, 255, 255, 255))
+            for (start, end), color in zip(connections, bone_color.tolist() if packed else bone_color):
+                pen.setColor(QColor.fromRgba(color) if packed else QColor(*color))
+                painter.setPen(pen)
+                painter.drawLine(QLineF(*points[start], *points[end]))
+
+        # 坐标轴
+        for i in range(1, 4):
+            painter.setPen(self.axis_pens[i - 1])
+            painter.drawLine(QLineF(*axes[0], *axes[i]))
+        painter.end()
+        return self.image
+
+
 # # 示例
 # num_points = 33
 # keypoints = np.random.random((num_points, 3))
@@ -0,0 +1,142 @@
+"""整个节目库的姿势索引：给定一个姿势，找出库中最相似的节目和时刻
+
+特征取 12 根主要骨骼（躯干、肩、髋、四肢）单位向量两两之间的点积（Gram 矩阵上三角），
+与人体整体朝向无关，摄像头里的姿势不需要先和参考帧对齐。
+所有帧的特征用 sklearn 的 BallTree 建索引，连同每个文件的修改时间保存在 root/pose_index.pkl；
+update 时只为新增或修改过的文件计算特征，删除的文件从索引中去掉。
+"""
+import os
+import pickle
+from collections import namedtuple
+from glob import glob
+
+import numpy as np
+from sklearn.neighbors import BallTree
+
+from detect_utils import connections, load_session_bone_arrays, poses_to_bone_arrays
+from pose_io import load_pose_sequence
+
+INDEX_NAME = 'pose_index.pkl'
+INDEX_VERSION = 1
+
+# 躯干两侧、双肩、双髋、上臂、前臂、大腿、小腿
+KEY_BONES = [connections.index(bone) for bone in [
+    (12, 24), (11, 23), (12, 11), (24, 23),
+    (12, 14), (14, 16), (11, 13), (13, 15),
+    (24, 26), (26, 28), (23, 25), (25, 27),
+]]
+_UPPER = np.triu_indices(len(KEY_BONES), k=1)
+
+Match = namedtuple('Match', ['path', 'frame', 'timestamp_ms', 'distance'])
+
+
+def pose_features(bone_arrays):
+    """(..., 35, 3) 单位骨骼向量 -> (..., 66) 旋转不变特征"""
+    key = np.asarray(bone_arrays)[..., KEY_BONES, :]
+    gram = np.einsum('...ik,...jk->...ij', key, key)
+    return gram[..., _UPPER[0], _UPPER[1]].astype(np.float32)
+
+
+class PoseIndex:
+    def __init__(self, root, leaf_size=40):
+        self.root = root
+        self.path = os.path.join(root, INDEX_NAME)
+        self.leaf_size = leaf_size
+        self.files = {}  # 文件名 -> (mtime, 帧数)，顺序与 features 中的分段一致
+        self.features = np.zeros((0, len(_UPPER[0])), dtype=np.float32)
+        self.file_ids = np.zeros(0, dtype=np.int32)  # 每一行特征来自第几个文件
+        self.frames = np.zeros(0, dtype=np.int32)
+        self.timestamps = np.zeros(0)
+        self.tree = None
+        self.load()
+
+    def __len__(self):
+        return len(self.features)
+
+    def load(self):
+        try:
+            with open(self.path, 'rb') as f:
+                state = pickle.load(f)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            return False
+        if state.get('version') != INDEX_VERSION:
+            return False
+        for key in ('files', 'features', 'file_ids', 'frames', 'timestamps', 'tree'):
+            setattr(self, key, state[key])
+        return True
+
+    def save(self):
+        state = {'version': INDEX_VERSION, 'files': self.files, 'features': self.features, 'file_ids': self.file_ids,
+                 'frames': self.frames, 'timestamps': self.timestamps, 'tree': self.tree}
+        with open(self.path + '.tmp', 'wb') as f:
+            pickle.dump(state, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(self.path + '.tmp', self.path)
+
+    def update(self, save=True):
+        """同步 root 下的 .npy 文件，返回是否有变化"""
+        names = sorted(os.path.basename(p) for p in glob(os.path.join(self.root, '*.npy')))
+        mtimes = {name: os.path.getmtime(os.path.join(self.root, name)) for name in names}
+        unchanged = [name for name in self.files if mtimes.get(name) == self.files[name][0]]
+        added = [name for name in names if name not in unchanged]
+        if len(unchanged) == len(self.files) and not added:
+            return False
+
+        # 保留未变的文件的特征，只为新增/修改的文件计算
+        old_ids = list(self.files)
+        keep = np.isin(self.file_ids, [old_ids.index(name) for name in unchanged])
+        features, frames, timestamps = [self.features[keep]], [self.frames[keep]], [self.timestamps[keep]]
+        remap = np.full(max(len(old_ids), 1), -1, dtype=np.int32)
+        remap[[old_ids.index(name) for name in unchanged]] = np.arange(len(unchanged))
+        file_ids = [remap[self.file_ids[keep]]]
+        files = {name: self.files[name] for name in unchanged}
+        for name in added:
+            path = os.path.join(self.root, name)
+            try:
+                sequence = load_pose_sequence(path, mmap_mode='r')
+                bone_arrays, _ = load_session_bone_arrays(path, sequence.landmarks, mmap_mode='r')
+            except (OSError, ValueError) as e:
+                print(f'pose index: skipped {name}: {e}')
+                continue
+            detected = np.flatnonzero(sequence.detected)  # 没检测到人体的帧沿用上一次结果，不必重复索引
+            features.append(pose_features(bone_arrays[detected]))
+            frames.append(detected.astype(np.int32))
+            timestamps.append(np.asarray(sequence.timestamps)[detected])
+            file_ids.append(np.full(len(detected), len(files), dtype=np.int32))
+            files[name] = (mtimes[name], len(sequence.landmarks))
+
+        self.files = files
+        self.features = np.concatenate(features)
+        self.file_ids = np.concatenate(file_ids)
+        self.frames = np.concatenate(frames)
+        self.timestamps = np.concatenate(timestamps)
+        self.tree = BallTree(self.features, leaf_size=self.leaf_size) if len(self.features) else None
+        if save:
+            self.save()
+        return True
+
+    def query(self, pose, k=5, candidates=None):
+        """返回最相似的 k 个节目（每个节目取最相似的一帧），按距离从小到大排列
+
+        pose 可以是 (33, 3) 关键点或 (35, 3) 单位骨骼向量。
+        candidates 为先从树中取出的近邻帧数，同一节目相邻帧很相似，需要多取一些才能凑够 k 个节目。
+        """
+        if self.tree is None:
+            return []
+        pose = np.asarray(pose, dtype=float)
+        if pose.shape[0] != len(connections):
+            pose = poses_to_bone_arrays(pose[None])[0][0]
+        candidates = min(candidates or k * 50, len(self))
+        distances, rows = self.tree.query(pose_features(pose)[None], k=candidates)
+        names = list(self.files)
+        matches = []
+        seen = set()
+        for distance, row in zip(distances[0], rows[0]):
+            file_id = self.file_ids[row]
+            if file_id in seen:
+                continue
+            seen.add(file_id)
+            matches.append(Match(os.path.join(self.root, names[file_id]), int(self.frames[row]),
+                                 float(self.timestamps[row]), float(distance)))
+            if len(matches) == k:
+                break
+        return matches
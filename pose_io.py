@@ -0,0 +1,47 @@
+"""关键点文件格式
+
+<name>.npy       (N, 33, 3) 关键点，每一帧视频对应一行；未检测到人体的帧沿用最近一次检测结果
+<name>.meta.npz  timestamps (N,) 毫秒, detected (N,) bool, visibility (N, 33), fps
+
+旧文件没有 .meta.npz，按固定帧率、全部检测到处理。
+"""
+import os
+from collections import namedtuple
+
+import numpy as np
+
+DEFAULT_FPS = 30.
+
+PoseSequence = namedtuple('PoseSequence', ['landmarks', 'timestamps', 'detected', 'visibility', 'fps'])
+
+
+def meta_path(path):
+    return os.path.splitext(path)[0] + '.meta.npz'
+
+
+def save_pose_meta(path, timestamps, detected, visibility, fps):
+    np.savez(meta_path(path), timestamps=np.asarray(timestamps, dtype=np.float64),
+             detected=np.asarray(detected, dtype=bool), visibility=np.asarray(visibility, dtype=np.float32),
+             fps=np.float64(fps))
+
+
+def load_pose_sequence(path, mmap_mode=None, fps=DEFAULT_FPS):
+    """fps 只在旧文件（没有 .meta.npz）时使用"""
+    landmarks = np.load(path, mmap_mode=mmap_mode)
+    n = len(landmarks)
+    meta = meta_path(path)
+    if os.path.exists(meta):
+        with np.load(meta) as m:
+            timestamps, detected, visibility, fps = m['timestamps'], m['detected'], m['visibility'], float(m['fps'])
+        if len(timestamps) != n:
+            raise ValueError(f'{meta} has {len(timestamps)} frames, {path} has {n}')
+    else:
+        timestamps = np.arange(n) * (1000. / fps)
+        detected = np.ones(n, dtype=bool)
+        visibility = np.ones((n, landmarks.shape[1]), dtype=np.float32)
+    return PoseSequence(landmarks, timestamps, detected, visibility, fps)
+
+
+def frame_at(timestamps, t_ms):
+    """t_ms 时刻应显示的帧（最后一个时间戳 <= t_ms 的帧）"""
+    return max(int(np.searchsorted(timestamps, t_ms, side='right')) - 1, 0)
@@ -1,13 +1,38 @@
+"""离线把视频批量转换成关键点 .npy
+
+    python process_video.py videos/session3 --workers 4
+
+每个进程持有一个 Pose 实例，按文件分配任务；解码在独立线程里预读，结果按块写盘，内存占用与视频长度无关。
+视频和参数都没变的文件根据 manifest.json 跳过；提取过程中定期写检查点，中断后从上次保存的帧继续。
+输出格式见 pose_io.py：每一帧都保留，另存时间戳、检测标记和可见度。
+"""
+import argparse
+import multiprocessing
 import os
+import queue
+import sys
+import threading
 import time
-from window_capture import capture
-import mediapipe as mp
+
 import cv2
+import mediapipe as mp
 import numpy as np
 from tqdm import tqdm
 
-from detect_utils import hwnd, landmarks_to_bone_arrays, landmarks_to_numpy, get_bottom_point
-from plot_utils import draw_skeleton
+from detect_utils import landmarks_to_numpy, landmarks_to_visibility
+from extraction_manifest import Manifest, read_json, write_json
+from pose_io import save_pose_meta
+
+VIDEO_EXTENSIONS = ('.mp4', '.avi', '.mov', '.mkv')
+PROGRESS_EVERY = 30  # 每处理多少帧汇报一次进度
+OUTPUT_FORMAT = 2  # 输出格式变化时递增，manifest 中旧格式的结果会重新提取
+META_DTYPE = np.dtype([('timestamp', '<f8'), ('detected', '?'), ('visibility', '<f4', (33,))])
+
+mp_pose = mp.solutions.pose
+
+_pose = None
+_settings = None
+_progress_queue = None
 
 
 def process(pose, img):
@@ -20,36 +45,277 @@ def process(pose, img):
     return results
 
 
-if __name__ == "__main__":
-    root_path = 'videos/session3'
-    filenames = os.listdir(root_path)
-    for filename in filenames:
-        file_path = os.path.join(root_path, filename)
-        cap = cv2.VideoCapture(file_path)
-        frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
-        fps = cap.get(cv2.CAP_PROP_FPS)
-        # print(f"视频总帧数：{frame_count}")
-        print(filename)
-        # print(f"视频帧率：{fps}")
-
-        mp_drawing = mp.solutions.drawing_utils
-        mp_pose = mp.solutions.pose
-        buffer = []
-        t0 = time.time()
-        with mp_pose.Pose(min_detection_confidence=0.5, min_tracking_confidence=0.5) as pose:
-            for i in tqdm(range(frame_count)):
-                ret, image = cap.read()
-                if not ret:
+class FrameReader(threading.Thread):
+    """解码线程，提前读取最多 read_ahead 帧，和推理并行。产出 (图像, 时间戳毫秒)"""
+
+    def __init__(self, cap, read_ahead=64, start=0):
+        super().__init__(daemon=True)
+        self.cap = cap
+        self.start_index = start
+        self.frames = queue.Queue(maxsize=read_ahead)
+
+    def run(self):
+        fps = self.cap.get(cv2.CAP_PROP_FPS) or 30.
+        i = self.start_index
+        while True:
+            ret, image = self.cap.read()
+            if not ret:
+                break
+            timestamp = self.cap.get(cv2.CAP_PROP_POS_MSEC)
+            if timestamp <= 0 and i > 0:  # 部分后端不提供时间戳
+                timestamp = i * 1000. / fps
+            self.frames.put((image, timestamp))
+            i += 1
+        self.frames.put(None)
+
+    def __iter__(self):
+        while True:
+            item = self.frames.get()
+            if item is None:
+                return
+            yield item
+
+
+class ChunkedNpyWriter:
+    """逐块追加写入 .npy：块先写进临时文件，close 时补上文件头，内存中只保留一个块。
+    resume_count > 0 时接着已有的临时文件继续写，临时文件不够长则从头开始（count 会是 0）"""
+
+    def __init__(self, path, item_shape=(33, 3), dtype=np.float64, chunk_size=256, resume_count=0):
+        self.path = path
+        self.tmp_path = path + '.part'
+        self.item_shape = tuple(item_shape)
+        self.dtype = np.dtype(dtype)
+        self.buffer = np.empty((chunk_size,) + self.item_shape, dtype=self.dtype)
+        self.buffered = 0
+        self.count = 0
+        self.item_size = self.dtype.itemsize * int(np.prod(self.item_shape))
+        resume_bytes = resume_count * self.item_size
+        if resume_count and os.path.exists(self.tmp_path) and os.path.getsize(self.tmp_path) >= resume_bytes:
+            self.file = open(self.tmp_path, 'r+b')
+            self.file.truncate(resume_bytes)
+            self.file.seek(resume_bytes)
+            self.count = resume_count
+        else:
+            self.file = open(self.tmp_path, 'wb')
+
+    def append(self, item):
+        self.buffer[self.buffered] = item
+        self.buffered += 1
+        if self.buffered == len(self.buffer):
+            self.flush()
+
+    def last_item(self):
+        """最后写入的一项（续写时用来恢复状态），没有则返回 None"""
+        if self.buffered:
+            return self.buffer[self.buffered - 1].copy()
+        if not self.count:
+            return None
+        self.file.flush()
+        item = np.fromfile(self.tmp_path, dtype=self.dtype, count=int(np.prod(self.item_shape)),
+                           offset=(self.count - 1) * self.item_size)
+        return item.reshape(self.item_shape)
+
+    def flush(self):
+        if self.buffered:
+            self.file.write(self.buffer[:self.buffered].tobytes())
+            self.count += self.buffered
+            self.buffered = 0
+        self.file.flush()
+
+    def close(self):
+        self.flush()
+        self.file.close()
+        header = {'descr': np.lib.format.dtype_to_descr(self.dtype), 'fortran_order': False,
+                  'shape': (self.count,) + self.item_shape}
+        with open(self.tmp_path, 'rb') as src, open(self.path, 'wb') as dst:
+            np.lib.format.write_array_header_1_0(dst, header)
+            while True:
+                block = src.read(1 << 20)
+                if not block:
                     break
-                results = process(pose, image)
-                if results.pose_landmarks is None:
-                    continue
-                arr = landmarks_to_numpy(results.pose_landmarks)
-                buffer.append(arr)
-        t1 = time.time()
-        print(f"总共用时{t1 - t0:.2f}s, average fps: {(frame_count / (t1 - t0)):.2f}")
-        buffer = np.array(buffer)
-        np.save(file_path.replace('.mp4', '.npy'), buffer)
-        print("result saved!")
-
-        cap.release()
+                dst.write(block)
+        os.remove(self.tmp_path)
+        return self.count
+
+
+def init_worker(progress_queue, settings):
+    global _pose, _settings, _progress_queue
+    _progress_queue = progress_queue
+    _settings = settings
+    _pose = mp_pose.Pose(**settings)
+
+
+def extract(task):
+    """在工作进程中处理一个视频，返回 (视频路径, 总帧数, 检测到的帧数, 本次处理的帧数, 用时)"""
+    video_path, output_path, source_hash, chunk_size, read_ahead, checkpoint_every = task
+    worker = multiprocessing.current_process().name
+    filename = os.path.basename(video_path)
+    _pose.reset()  # 不同视频之间不沿用跟踪状态
+
+    # 检查点记录已处理的视频帧数和已写入的关键点数，视频或参数变了就作废
+    checkpoint_path = output_path + '.ckpt'
+    checkpoint = read_json(checkpoint_path)
+    valid = checkpoint is not None and checkpoint['sha256'] == source_hash and checkpoint['settings'] == _settings
+    frames, items = (checkpoint['frames'], checkpoint['items']) if valid else (0, 0)
+    writer = ChunkedNpyWriter(output_path, chunk_size=chunk_size, resume_count=items)
+    meta_writer = ChunkedNpyWriter(output_path + '.meta', item_shape=(), dtype=META_DTYPE, chunk_size=chunk_size, resume_count=frames)
+    if writer.count != items or meta_writer.count != frames:  # 临时文件和检查点对不上，从头开始
+        writer.file.close()
+        meta_writer.file.close()
+        writer = ChunkedNpyWriter(output_path, chunk_size=chunk_size)
+        meta_writer = ChunkedNpyWriter(output_path + '.meta', item_shape=(), dtype=META_DTYPE, chunk_size=chunk_size)
+    start = meta_writer.count
+    detected = int(checkpoint['detected']) if start else 0
+
+    # 未检测到人体的帧沿用上一次的关键点；开头就没检测到的帧等第一次检测到后补写
+    last = writer.last_item()
+    pending = meta_writer.count - writer.count
+    record = np.zeros((), dtype=META_DTYPE)
+
+    cap = cv2.VideoCapture(video_path)
+    frame_count = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+    fps = cap.get(cv2.CAP_PROP_FPS) or 30.
+    if start:
+        cap.set(cv2.CAP_PROP_POS_FRAMES, start)
+    reader = FrameReader(cap, read_ahead, start)
+    reader.start()
+
+    t0 = time.time()
+    processed = start
+    for image, timestamp in reader:
+        results = process(_pose, image)
+        processed += 1
+        record['timestamp'] = timestamp
+        record['detected'] = results.pose_landmarks is not None
+        if results.pose_landmarks is not None:
+            detected += 1
+            last = landmarks_to_numpy(results.pose_landmarks)
+            record['visibility'] = landmarks_to_visibility(results.pose_landmarks)
+            for _ in range(pending + 1):
+                writer.append(last)
+            pending = 0
+        else:
+            record['visibility'] = 0
+            if last is not None:
+                writer.append(last)
+            else:
+                pending += 1
+        meta_writer.append(record)
+        if processed % PROGRESS_EVERY == 0:
+            _progress_queue.put((worker, filename, processed, frame_count, (processed - start) / (time.time() - t0)))
+        if processed % checkpoint_every == 0:
+            writer.flush()
+            meta_writer.flush()
+            write_json(checkpoint_path, {'sha256': source_hash, 'settings': _settings, 'frames': meta_writer.count,
+                                         'items': writer.count, 'detected': detected})
+    reader.join()
+    cap.release()
+    for _ in range(pending):  # 整段视频都没检测到人体
+        writer.append(np.zeros((33, 3)))
+    writer.close()
+    meta_writer.close()
+    meta = np.load(meta_writer.path, mmap_mode='r')
+    save_pose_meta(output_path, meta['timestamp'], meta['detected'], meta['visibility'], fps)
+    del meta
+    os.remove(meta_writer.path)
+    if os.path.exists(checkpoint_path):
+        os.remove(checkpoint_path)
+    elapsed = time.time() - t0
+    _progress_queue.put((worker, filename, processed, processed, (processed - start) / max(elapsed, 1e-6)))
+    return video_path, processed, detected, processed - start, elapsed
+
+
+def find_videos(root):
+    return sorted(os.path.join(root, name) for name in os.listdir(root) if name.lower().endswith(VIDEO_EXTENSIONS))
+
+
+def run(root, workers, settings, chunk_size=256, read_ahead=64, checkpoint_every=300, force=False):
+    """返回处理失败的视频 [(路径, 异常)]；一个视频出错不影响其余视频和汇总"""
+    manifest = Manifest(root)
+    tasks = []
+    hashes = {}
+    for path in find_videos(root):
+        output_path = os.path.splitext(path)[0] + '.npy'
+        hashes[path] = manifest.source_hash(path)
+        if not force and manifest.is_current(path, hashes[path], settings, output_path, OUTPUT_FORMAT):
+            print(f"{os.path.basename(path)}: up to date, skipped")
+            continue
+        tasks.append((path, output_path, hashes[path], chunk_size, read_ahead, checkpoint_every))
+    if not tasks:
+        print(f"nothing to do in {root}")
+        return []
+
+    def on_done(result):  # 在主进程的结果线程中调用，每完成一个视频就更新 manifest
+        video_path, frames = result[0], result[1]
+        manifest.record(video_path, hashes[video_path], settings, os.path.splitext(video_path)[0] + '.npy', frames, OUTPUT_FORMAT)
+        manifest.save()
+
+    progress_queue = multiprocessing.Queue()
+    bars = {}
+    current = {}  # 每个进程正在处理的文件
+    t0 = time.time()
+    with multiprocessing.Pool(min(workers, len(tasks)), initializer=init_worker, initargs=(progress_queue, settings)) as pool:
+        pending = [pool.apply_async(extract, (task,), callback=on_done) for task in tasks]
+        while True:
+            try:
+                worker, filename, done, total, fps = progress_queue.get(timeout=0.2)
+            except queue.Empty:
+                if all(p.ready() for p in pending):
+                    break
+                continue
+            if worker not in bars:
+                bars[worker] = tqdm(total=total, position=len(bars), desc=worker, unit='frame')
+            bar = bars[worker]
+            if current.get(worker) != filename:
+                current[worker] = filename
+                bar.reset(total=total)
+            bar.total = total
+            bar.n = done
+            bar.set_postfix_str(f"{filename} {fps:.1f} fps")
+        stats, failed = [], []
+        for task, p in zip(tasks, pending):
+            try:
+                stats.append(p.get())
+            except Exception as e:  # 失败的视频不写 manifest，下次运行会重新提取（有检查点时从检查点继续）
+                failed.append((task[0], e))
+    for bar in bars.values():
+        bar.close()
+
+    total_frames = 0
+    for video_path, processed, detected, new_frames, elapsed in stats:
+        total_frames += new_frames
+        resumed = f" (resumed at frame {processed - new_frames})" if new_frames != processed else ""
+        print(f"{os.path.basename(video_path)}: {processed} frames, {detected} detected{resumed}, {elapsed:.2f}s, {new_frames / max(elapsed, 1e-6):.2f} fps")
+    elapsed = time.time() - t0
+    print(f"总共用时{elapsed:.2f}s, {len(stats)} videos, average fps: {total_frames / max(elapsed, 1e-6):.2f}")
+    if failed:
+        print(f"{len(failed)} video(s) failed:")
+        for video_path, error in failed:
+            print(f"  {os.path.basename(video_path)}: {type(error).__name__}: {error}")
+    return failed
+
+
+def main():
+    parser = argparse.ArgumentParser(description='批量提取视频中的人体关键点')
+    parser.add_argument('root', nargs='?', default='videos/session3', help='视频所在目录')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='进程数')
+    parser.add_argument('--chunk-size', type=int, default=256, help='每次写盘的帧数')
+    parser.add_argument('--read-ahead', type=int, default=64, help='解码线程最多预读的帧数')
+    parser.add_argument('--min-detection-confidence', type=float, default=0.5)
+    parser.add_argument('--min-tracking-confidence', type=float, default=0.5)
+    parser.add_argument('--model-complexity', type=int, default=1, choices=(0, 1, 2))
+    parser.add_argument('--checkpoint-every', type=int, default=300, help='每处理多少帧保存一次检查点')
+    parser.add_argument('--force', action='store_true', help='忽略 manifest，全部重新提取')
+    args = parser.parse_args()
+
+    settings = {
+        'min_detection_confidence': args.min_detection_confidence,
+        'min_tracking_confidence': args.min_tracking_confidence,
+        'model_complexity': args.model_complexity,
+    }
+    failed = run(args.root, args.workers, settings, args.chunk_size, args.read_ahead, args.checkpoint_every, args.force)
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == "__main__":
+    main()
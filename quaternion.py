@@ -0,0 +1,145 @@
+"""四元数运算，约定 q = (w, x, y, z)
+
+所有函数都接受 (..., 4) 的批量数组并按 numpy 规则广播；带 out 参数的函数可以原地写回（out 可以就是输入本身），
+单个四元数走 python 标量的快速路径，写回 out 时不创建新数组。
+只依赖 numpy，供 Player 拖动视角和导出时整段旋转使用。
+"""
+import math
+
+import numpy as np
+
+IDENTITY = np.array([1., 0., 0., 0.])
+
+_CONJUGATE = np.array([1., -1., -1., -1.])
+
+
+def identity(n=None):
+    return IDENTITY.copy() if n is None else np.tile(IDENTITY, (n, 1))
+
+
+def from_axis_angle(axis, angle, out=None):
+    """axis (..., 3) 为单位向量，angle (...) 为弧度"""
+    if np.ndim(axis) == 1 and np.ndim(angle) == 0:
+        if out is None:
+            out = np.empty(4)
+        out[:] = _from_axis_angle_scalar(np.asarray(axis).tolist(), float(angle))
+        return out
+    axis = np.asarray(axis, dtype=float)
+    half_angle = np.asarray(angle, dtype=float) * 0.5
+    if out is None:
+        out = np.empty(np.broadcast_shapes(axis.shape[:-1], half_angle.shape) + (4,))
+    np.cos(half_angle, out=out[..., 0])
+    np.multiply(axis, np.sin(half_angle)[..., None], out=out[..., 1:])
+    return out
+
+
+def _from_axis_angle_scalar(axis, angle):
+    x, y, z = axis
+    sin_half_angle = math.sin(angle * 0.5)
+    return math.cos(angle * 0.5), sin_half_angle * x, sin_half_angle * y, sin_half_angle * z
+
+
+def _multiply_scalar(q1, q2):
+    w1, x1, y1, z1 = q1
+    w2, x2, y2, z2 = q2
+    return (w1 * w2 - x1 * x2 - y1 * y2 - z1 * z2,
+            w1 * x2 + x1 * w2 + y1 * z2 - z1 * y2,
+            w1 * y2 + y1 * w2 + z1 * x2 - x1 * z2,
+            w1 * z2 + z1 * w2 + x1 * y2 - y1 * x2)
+
+
+def multiply(q1, q2, out=None):
+    """Hamilton 积 q1 * q2（先转 q2 再转 q1）"""
+    if np.ndim(q1) == 1 and np.ndim(q2) == 1:
+        # 单个四元数时用 python 标量计算，比 einsum 的调用开销小得多
+        product = _multiply_scalar(np.asarray(q1).tolist(), np.asarray(q2).tolist())
+        if out is None:
+            return np.array(product)
+        out[:] = product
+        return out
+    q1 = np.asarray(q1, dtype=float)
+    q2 = np.asarray(q2, dtype=float)
+    if out is None:
+        out = np.empty(np.broadcast_shapes(q1.shape, q2.shape))
+    # 四个分量都算完再写入，out 与输入是同一个数组时也正确
+    w, x, y, z = _multiply_scalar(np.moveaxis(q1, -1, 0), np.moveaxis(q2, -1, 0))
+    out[..., 0] = w
+    out[..., 1] = x
+    out[..., 2] = y
+    out[..., 3] = z
+    return out
+
+
+def conjugate(q, out=None):
+    return np.multiply(q, _CONJUGATE, out=out)
+
+
+def normalize(q, out=None):
+    q = np.asarray(q, dtype=float)
+    return np.divide(q, np.linalg.norm(q, axis=-1, keepdims=True), out=out)
+
+
+def to_matrix(q):
+    """单位四元数 (..., 4) -> 旋转矩阵 (..., 3, 3)"""
+    q = np.asarray(q, dtype=float)
+    w, x, y, z = q[..., 0], q[..., 1], q[..., 2], q[..., 3]
+    R = np.empty(q.shape[:-1] + (3, 3))
+    R[..., 0, 0] = 1 - 2 * (y * y + z * z)
+    R[..., 0, 1] = 2 * (x * y - z * w)
+    R[..., 0, 2] = 2 * (x * z + y * w)
+    R[..., 1, 0] = 2 * (x * y + z * w)
+    R[..., 1, 1] = 1 - 2 * (x * x + z * z)
+    R[..., 1, 2] = 2 * (y * z - x * w)
+    R[..., 2, 0] = 2 * (x * z - y * w)
+    R[..., 2, 1] = 2 * (y * z + x * w)
+    R[..., 2, 2] = 1 - 2 * (x * x + y * y)
+    return R
+
+
+def rotate_vector(q, v):
+    """q * (0, v) * q^-1 的向量部分，q (..., 4) 与 v (..., 3) 逐个对应"""
+    if np.ndim(q) == 1 and np.ndim(v) == 1:
+        q = np.asarray(q).tolist()
+        qv = _multiply_scalar(_multiply_scalar(q, [0.] + np.asarray(v).tolist()), (q[0], -q[1], -q[2], -q[3]))
+        return np.array(qv[1:])
+    return np.einsum('...ij,...j->...i', to_matrix(q), v)
+
+
+def rotate_session(landmarks, q, out=None, chunk_size=4096):
+    """旋转整段关键点 (N, K, 3)
+
+    q 为单个四元数 (4,) 时所有帧共用一个旋转，为 (N, 4) 时逐帧旋转。
+    out 可以是 np.lib.format.open_memmap 打开的文件，按块处理，导出长视频时不必整段读进内存。
+    """
+    q = np.asarray(q, dtype=float)
+    if out is None:
+        out = np.empty(landmarks.shape)
+    R = np.swapaxes(to_matrix(q), -1, -2)
+    for start in range(0, len(landmarks), chunk_size):
+        end = start + chunk_size
+        np.matmul(landmarks[start:end], R if q.ndim == 1 else R[start:end], out=out[start:end])
+    return out
+
+
+class Orientation:
+    """原地累积的视角旋转，每 renormalize_every 次更新重新归一化一次，长时间拖动也不会漂移"""
+
+    def __init__(self, renormalize_every=64):
+        self.q = identity()
+        self.renormalize_every = renormalize_every
+        self._updates = 0
+
+    def reset(self):
+        self.q[:] = IDENTITY
+        self._updates = 0
+
+    def rotate(self, axis, angle):
+        """在当前旋转之后（物体自身坐标系下）再绕 axis 转 angle 弧度"""
+        self.q[:] = _multiply_scalar(self.q.tolist(), _from_axis_angle_scalar(np.asarray(axis).tolist(), float(angle)))
+        self._updates += 1
+        if self._updates >= self.renormalize_every:
+            normalize(self.q, out=self.q)
+            self._updates = 0
+
+    def apply(self, v):
+        return rotate_vector(self.q, v)
@@ -0,0 +1,135 @@
+"""不开窗口运行摄像头管线，统计各阶段延迟和吞吐量
+
+    python replay.py videos/session1/1-side\ step+clap.npy              # 关键点流，尽快回放
+    python replay.py recording.mp4 --realtime --reference videos/session1/1-side\ step+clap.npy
+    python replay.py camera --frames 300 --record my_session.npy         # 录制摄像头会话，之后可以重放
+
+帧源、CaptureThread、InferenceThread、TemporalScorer.align_and_score 与 CameraWindow/app.py 中的完全相同。
+非实时模式下队列不丢帧，每一帧都经过完整管线，结果可重复；姿态估计固定在 --level 档，不随延迟自动调整。
+参考节目默认取帧源本身（关键点流）；视频和摄像头不指定 --reference 时不统计打分阶段。
+"""
+import argparse
+import sys
+import time
+
+import numpy as np
+from PyQt5.QtCore import QCoreApplication, Qt
+
+from camera_pipeline import CaptureThread, FrameQueue, InferenceThread
+from detect_utils import load_session_bone_arrays
+from frame_sources import LandmarkRecorder, LandmarkStreamSource, open_source
+from instrumentation import PIPELINE_STAGES
+from inference_control import DEFAULT_LEVELS, AdaptiveController
+from pose_io import frame_at, load_pose_sequence
+from temporal_scoring import TemporalScorer
+
+# 阶段名、起点、终点，均为 detections_updated 的 stamps 中的键（received、scored 由本脚本补充）
+STAGES = PIPELINE_STAGES + (('scoring', 'received', 'scored'), ('total', 'read', 'scored'))
+PERCENTILES = (50, 90, 99)
+
+
+class Harness:
+    def __init__(self, app, source, reference=None, frames=None, realtime=False, level=0, recorder=None):
+        self.app = app
+        self.source = source
+        self.frames = frames
+        self.reference = None
+        if reference is not None:
+            sequence = load_pose_sequence(reference, mmap_mode='r')
+            self.reference = load_session_bone_arrays(reference, sequence.landmarks, mmap_mode='r')[0]
+            self.reference_timestamps = np.asarray(sequence.timestamps)
+            self.reference_detected = np.asarray(sequence.detected)
+            self.reference_duration = self.reference_timestamps[-1] + 1000. / sequence.fps
+        self.scorer = TemporalScorer()
+        self.t0 = None  # 第一帧的媒体时间
+        self.scores = []
+        self.samples = []
+
+        # 实时模式模拟摄像头，队列只保留最新一帧；否则每一帧都要处理
+        self.frame_queue = FrameQueue(maxsize=1, lossless=not realtime)
+        controller = AdaptiveController(levels=(DEFAULT_LEVELS[level],))
+        self.capture_thread = CaptureThread(source, self.frame_queue)
+        self.inference_thread = InferenceThread(self.frame_queue, controller=controller, recorder=recorder)
+        # 尽快回放时推理线程等打分完成再处理下一帧，否则信号在主线程排队，延迟只反映积压的长度
+        connection = Qt.QueuedConnection if realtime else Qt.BlockingQueuedConnection
+        self.inference_thread.detections_updated.connect(self.on_detections, connection)
+        self.inference_thread.stream_ended.connect(self.app.quit)
+
+    def run(self):
+        start = time.perf_counter()
+        self.inference_thread.start()
+        self.capture_thread.start()
+        self.app.exec_()
+        elapsed = time.perf_counter() - start
+        self.stop()
+        return elapsed
+
+    def stop(self):
+        for thread in (self.capture_thread, self.inference_thread):
+            thread.requestInterruption()
+            # 推理线程可能正阻塞在 BlockingQueuedConnection 的信号上，等待时继续处理事件
+            while not thread.wait(10):
+                self.app.processEvents()
+        self.source.release()
+
+    def on_detections(self, results):
+        stamps = results['stamps']
+        stamps['received'] = time.perf_counter()
+        if self.reference is not None:
+            # 相当于第一帧时从头开始播放参考节目，按帧源的媒体时间循环对应
+            if self.t0 is None:
+                self.t0 = results['timestamp']
+            t_ms = (results['timestamp'] - self.t0) * 1000
+            position = frame_at(self.reference_timestamps, t_ms % self.reference_duration)
+            if self.reference_detected[position]:
+                result = self.scorer.align_and_score(results['bone_arrays'], self.reference, position,
+                                                     self.reference_detected)
+                if result is not None:
+                    self.scores.append(result.score)
+        stamps['scored'] = time.perf_counter()
+        self.samples.append(stamps)
+        if self.frames is not None and len(self.samples) >= self.frames:
+            self.app.quit()
+
+    def report(self, elapsed):
+        n = len(self.samples)
+        print(f'{n} frames in {elapsed:.2f} s, {n / elapsed:.1f} fps, {self.frame_queue.dropped} dropped')
+        header = ''.join(f'{"p" + str(p):>10s}' for p in PERCENTILES)
+        print(f'{"stage (ms)":<12s}{header}{"max":>10s}{"mean":>10s}')
+        for name, begin, end in STAGES:
+            durations = np.array([s[end] - s[begin] for s in self.samples if begin in s and end in s]) * 1000
+            if not len(durations) or (name == 'scoring' and self.reference is None):
+                continue
+            values = ''.join(f'{v:>10.2f}' for v in np.percentile(durations, PERCENTILES))
+            print(f'{name:<12s}{values}{durations.max():>10.2f}{durations.mean():>10.2f}')
+        if self.scores:
+            print(f'mean score {np.mean(self.scores) * 100:.2f}%')
+
+
+def main():
+    parser = argparse.ArgumentParser(description='不开窗口回放摄像头管线，统计各阶段延迟')
+    parser.add_argument('source', help="'camera'、摄像头编号、视频文件或关键点 .npy")
+    parser.add_argument('--reference', help='参考节目 .npy，用于打分阶段')
+    parser.add_argument('--realtime', action='store_true', help='按原始帧率回放（默认尽快回放）')
+    parser.add_argument('--frames', type=int, help='最多处理多少帧')
+    parser.add_argument('--level', type=int, default=0, choices=range(len(DEFAULT_LEVELS)),
+                        help='inference_control.DEFAULT_LEVELS 中的推理档位')
+    parser.add_argument('--record', help='把未经平滑的检测结果保存为关键点 .npy')
+    args = parser.parse_args()
+
+    app = QCoreApplication(sys.argv)
+    source = open_source(args.source, realtime=args.realtime)
+    if not source.isOpened():
+        parser.error(f'cannot open {args.source}')
+    reference = args.reference or (args.source if isinstance(source, LandmarkStreamSource) else None)
+    recorder = LandmarkRecorder() if args.record else None
+    harness = Harness(app, source, reference, args.frames, args.realtime, args.level, recorder)
+    elapsed = harness.run()
+    harness.report(elapsed)
+    if recorder is not None:
+        recorder.save(args.record)
+        print(f'recorded {len(recorder)} frames to {args.record}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,80 @@
+"""余弦相似度 -> 得分 -> 骨骼颜色，全部用预先算好的查找表
+
+原来每帧先用 scipy 的 interp1d 把 35 个余弦值映射成得分，再用列表推导逐个调用 get_color。
+ScoreCurve 在构造时把整条曲线离散成查找表，打分和着色都只是一次数组下标运算；
+颜色打包成 Qt 的 QRgb（0xAARRGGBB，uint32），SkeletonRenderer 可以直接使用。
+"""
+from collections import namedtuple
+
+import numpy as np
+
+# 余弦值 -> 得分的折线：夹角 60° 得 0.3 分，45° 得 0.5 分，30° 得 0.9 分
+DEFAULT_X = (0, np.cos(np.radians(60)), np.cos(np.radians(45)), np.cos(np.radians(30)), 1)
+DEFAULT_Y = (0, 0.3, 0.5, 0.9, 1)
+
+
+def score_colors(scores):
+    """与 plot_utils.get_color 相同的红-黄-绿渐变，scores (...,) -> RGBA (..., 4) uint8"""
+    scores = np.asarray(scores, dtype=float)
+    rgba = np.zeros(scores.shape + (4,), dtype=np.uint8)
+    low = scores <= 0.5
+    rgba[..., 0] = np.where(low, 255, (255 * (1 - (scores - 0.5) * 2)).astype(int))
+    rgba[..., 1] = np.where(low, (255 * (scores * 2)).astype(int), 255)
+    rgba[..., 3] = 255
+    return rgba
+
+
+def pack_rgba(rgba):
+    """RGBA (..., 4) uint8 -> QRgb (...,) uint32"""
+    rgba = np.asarray(rgba, dtype=np.uint32)
+    return (rgba[..., 3] << 24) | (rgba[..., 0] << 16) | (rgba[..., 1] << 8) | rgba[..., 2]
+
+
+def unpack_rgba(packed):
+    """QRgb (...,) uint32 -> RGBA (..., 4) uint8"""
+    packed = np.asarray(packed, dtype=np.uint32)
+    return np.stack([packed >> 16, packed >> 8, packed, packed >> 24], axis=-1).astype(np.uint8)
+
+
+PoseScore = namedtuple('PoseScore', ['bone_scores', 'colors', 'score'])
+
+
+class ScoreCurve:
+    """可配置的得分曲线
+
+    xs、ys 为折线的节点（余弦值 -> 得分），范围外取两端的值；resolution 为查找表在 [-1, 1] 上的格数。
+    colors 为得分 -> RGBA 的函数，默认红-黄-绿渐变。
+    """
+
+    def __init__(self, xs=DEFAULT_X, ys=DEFAULT_Y, resolution=4096, colors=score_colors):
+        self.xs = tuple(xs)
+        self.ys = tuple(ys)
+        self.resolution = resolution
+        grid = np.linspace(-1, 1, resolution)
+        self.score_lut = np.interp(grid, self.xs, self.ys)
+        self.color_lut = pack_rgba(colors(self.score_lut))  # 余弦值直接查颜色，不必先算得分
+        self._scale = (resolution - 1) / 2
+
+    def index(self, cosines):
+        index = np.rint((np.asarray(cosines, dtype=float) + 1) * self._scale).astype(np.intp)
+        return np.clip(index, 0, self.resolution - 1, out=index)
+
+    def score(self, cosines):
+        return self.score_lut[self.index(cosines)]
+
+    def colors(self, cosines):
+        """QRgb uint32"""
+        return self.color_lut[self.index(cosines)]
+
+    def score_pose(self, user, reference):
+        """两组单位骨骼向量 (35, 3) 逐根比较：每根骨骼的得分、颜色和平均得分"""
+        index = self.index(np.einsum('ij,ij->i', user, reference))
+        bone_scores = self.score_lut[index]
+        return PoseScore(bone_scores, self.color_lut[index], float(bone_scores.mean()))
+
+
+DEFAULT_CURVE = ScoreCurve()
+
+
+def score_pose(user, reference, curve=None):
+    return (curve or DEFAULT_CURVE).score_pose(user, reference)
@@ -0,0 +1,126 @@
+"""以内存映射方式打开关键点文件，并用 LRU 保留最近打开的节目"""
+import os
+import threading
+from concurrent.futures import CancelledError, ThreadPoolExecutor
+from collections import OrderedDict, namedtuple
+
+from detect_utils import load_session_bone_arrays
+from pose_io import DEFAULT_FPS, load_pose_sequence
+
+Session = namedtuple('Session', ['path', 'mtime', 'landmarks', 'timestamps', 'detected', 'visibility', 'fps',
+                                 'bone_arrays', 'bone_lengths'])
+
+
+def open_session(path, fps=DEFAULT_FPS, mmap_mode='r', warm_frames=0):
+    """打开一个节目，关键点和骨骼向量缓存都只做内存映射，真正用到的帧才会被读入。
+    warm_frames > 0 时预先读入开头的若干帧，开始播放时不用等磁盘"""
+    if not (path.endswith('.npy') and os.path.exists(path)):
+        raise FileNotFoundError(f'file not found at path {path}')
+    sequence = load_pose_sequence(path, mmap_mode=mmap_mode, fps=fps)  # fps 仅用于没有时间信息的旧文件
+    if sequence.landmarks.ndim != 3 or sequence.landmarks.shape[1:] != (33, 3):
+        raise ValueError(f'{path}: expected (N, 33, 3) landmarks, got {sequence.landmarks.shape}')
+    bone_arrays, bone_lengths = load_session_bone_arrays(path, sequence.landmarks, mmap_mode=mmap_mode)
+    if warm_frames:
+        sequence.landmarks[:warm_frames].sum()
+        bone_arrays[:warm_frames].sum()
+    return Session(path, os.path.getmtime(path), *sequence, bone_arrays, bone_lengths)
+
+
+def session_nbytes(session):
+    """节目全部数据的大小；内存映射部分按全部读入计算，作为常驻内存的上限"""
+    return sum(getattr(session, field).nbytes for field in ('landmarks', 'timestamps', 'detected', 'visibility', 'bone_arrays', 'bone_lengths'))
+
+
+class SessionLibrary:
+    """最近打开的节目的 LRU 缓存，总大小超过 max_bytes 时淘汰最久未使用的（最新打开的总会保留）"""
+
+    def __init__(self, max_bytes=256 * 1024 * 1024, mmap_mode='r'):
+        self.max_bytes = max_bytes
+        self.mmap_mode = mmap_mode
+        self.sessions = OrderedDict()
+        self.nbytes = 0
+        self.lock = threading.Lock()
+
+    def open(self, path, fps=DEFAULT_FPS, warm_frames=0):
+        path = os.path.normpath(path)
+        with self.lock:
+            session = self.sessions.get(path)
+            if session is not None and self._is_fresh(session):
+                self.sessions.move_to_end(path)
+                return session
+        session = open_session(path, fps, self.mmap_mode, warm_frames)
+        self.put(session)
+        return session
+
+    def put(self, session):
+        with self.lock:
+            old = self.sessions.pop(session.path, None)
+            if old is not None:
+                self.nbytes -= session_nbytes(old)
+            self.sessions[session.path] = session
+            self.nbytes += session_nbytes(session)
+            self._evict()
+
+    def set_max_bytes(self, max_bytes):
+        with self.lock:
+            self.max_bytes = max_bytes
+            self._evict()
+
+    def __contains__(self, path):
+        return os.path.normpath(path) in self.sessions
+
+    def _evict(self):
+        while self.nbytes > self.max_bytes and len(self.sessions) > 1:
+            _, evicted = self.sessions.popitem(last=False)
+            self.nbytes -= session_nbytes(evicted)
+
+    @staticmethod
+    def _is_fresh(session):
+        """文件被重新生成后缓存作废"""
+        try:
+            return os.path.getmtime(session.path) == session.mtime
+        except OSError:
+            return False
+
+
+class Prefetcher:
+    """在后台线程中提前打开下一个节目（读入、校验、计算骨骼向量），放进 SessionLibrary
+
+    每个路径只有一个进行中的预读（pending），open 同一路径时等它完成，不会和后台线程同时生成骨骼向量缓存
+    """
+
+    def __init__(self, library: SessionLibrary, warm_frames=30):
+        self.library = library
+        self.warm_frames = warm_frames
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.pending = {}  # 路径 -> 未完成的 Future
+        self.lock = threading.Lock()
+
+    def prefetch(self, path, fps=DEFAULT_FPS):
+        path = os.path.normpath(path)
+        with self.lock:
+            if path in self.pending or path in self.library:
+                return
+            future = self.pending[path] = self.executor.submit(self.library.open, path, fps, self.warm_frames)
+        future.add_done_callback(lambda f: self._done(path, f))
+
+    def _done(self, path, future):
+        with self.lock:
+            if self.pending.get(path) is future:
+                del self.pending[path]
+
+    def open(self, path, fps=DEFAULT_FPS):
+        """如果正在预读这个节目就等它读完，否则直接同步打开；预读失败时同步重试一次以抛出真实错误"""
+        path = os.path.normpath(path)
+        with self.lock:
+            future = self.pending.get(path)
+        if future is not None:
+            try:
+                return future.result()
+            except (OSError, ValueError, CancelledError):
+                pass
+        return self.library.open(path, fps)
+
+    def shutdown(self):
+        """取消排队中的预读，正在进行的一个读完后线程退出"""
+        self.executor.shutdown(wait=False, cancel_futures=True)
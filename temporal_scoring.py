@@ -0,0 +1,228 @@
+"""按时间对齐（DTW）给用户动作打分
+
+calculate_similarity 原来只拿用户当前姿势和播放器此刻显示的那一帧比较，慢半拍就会被判为动作错误。
+这里缓存用户最近的姿势，与参考节目当前位置附近的一段做动态时间规整（DTW），
+用匹配到的参考帧打分：
+    实时：TemporalScorer，子序列 DTW（起点、终点在参考窗口内自由），随窗口滑动每帧计算一次
+    离线：score_attempt，整段录制与整个参考节目做带状（Sakoe-Chiba）DTW
+
+帧间距离为 1 - 35 根骨骼单位向量余弦的平均值，代价矩阵一次矩阵乘法算出；
+DTW 递推按反对角线向量化：每条反对角线上的格子只依赖前两条，把矩阵按反对角线错位存放后，
+一条反对角线就是一行，几次切片运算算完。
+"""
+from collections import namedtuple
+from functools import lru_cache
+
+import numpy as np
+
+import instrumentation
+from cosine_distance import align_rotation
+from scoring import DEFAULT_CURVE
+
+N_BONES = 35
+
+
+class PoseBuffer:
+    """定长环形缓冲区，保存用户最近 capacity 帧的骨骼向量"""
+
+    def __init__(self, capacity=30, n_bones=N_BONES):
+        self.capacity = capacity
+        self.data = np.zeros((capacity, n_bones, 3))
+        self.count = 0  # 累计写入的帧数
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def clear(self):
+        self.count = 0
+
+    def append(self, bone_arrays):
+        self.data[self.count % self.capacity] = bone_arrays
+        self.count += 1
+
+    def latest(self, n=None):
+        """最近 n 帧，按时间先后排列"""
+        n = len(self) if n is None else min(n, len(self))
+        end = self.count % self.capacity
+        if end >= n:
+            return self.data[end - n:end]
+        return np.concatenate([self.data[end - n:], self.data[:end]])
+
+
+def frame_costs(user, reference):
+    """(n, 35, 3) 与 (m, 35, 3) 单位骨骼向量两两之间的距离 1 - 平均余弦，形状 (n, m)"""
+    n_bones = user.shape[1]
+    similarity = np.dot(user.reshape(len(user), -1), reference.reshape(len(reference), -1).T) / n_bones
+    return 1. - similarity
+
+
+@lru_cache(maxsize=32)
+def _skew_index(n, m):
+    """反对角线排列：A[k, i] = D[i, k - i]，k = 0..n+m，i = 0..n；越界的格子返回 valid=False"""
+    k = np.arange(n + m + 1)[:, None]
+    i = np.arange(n + 1)[None, :]
+    j = k - i
+    valid = (i >= 1) & (j >= 1) & (j <= m)
+    return np.where(valid, i - 1, 0), np.where(valid, j - 1, 0), valid
+
+
+def dtw(costs, subsequence=False, band=None):
+    """累积代价矩阵 D，形状 (n+1, m+1)，第 0 行、第 0 列为边界
+
+    subsequence: 用户序列可以从参考序列的任意一帧开始匹配（D[0, :] = 0）
+    band: Sakoe-Chiba 带宽（帧），按两段长度之比沿对角线放置，带外的格子不可达
+    """
+    n, m = costs.shape
+    if band is not None:
+        i = np.arange(n)[:, None]
+        j = np.arange(m)[None, :]
+        costs = np.where(np.abs(j - i * (m - 1) / max(n - 1, 1)) > band, np.inf, costs)
+
+    # 按反对角线重新排列，每条反对角线是连续的一行，只依赖前两行，递推时全是切片运算
+    rows, cols, valid = _skew_index(n, m)
+    C = np.where(valid, costs[rows, cols], np.inf)
+    A = np.full((n + m + 1, n + 1), np.inf)
+    A[0, 0] = 0.
+    if subsequence:
+        A[:m + 1, 0] = 0.
+    best = np.empty(n)
+    for k in range(2, n + m + 1):
+        # 上 D[i-1, j] = A[k-1, i-1]，左 D[i, j-1] = A[k-1, i]，左上 D[i-1, j-1] = A[k-2, i-1]
+        np.minimum(A[k - 1, :-1], A[k - 1, 1:], out=best)
+        np.minimum(best, A[k - 2, :-1], out=best)
+        np.add(C[k, 1:], best, out=A[k, 1:])
+
+    i = np.arange(n + 1)[:, None]
+    j = np.arange(m + 1)[None, :]
+    return A[i + j, np.broadcast_to(i, (n + 1, m + 1))]
+
+
+def warping_path(D):
+    """从 D[n, 终点] 回溯出匹配路径，返回 (用户帧, 参考帧) 下标对，按时间先后排列"""
+    n, m = D.shape[0] - 1, D.shape[1] - 1
+    i, j = n, m
+    path = []
+    while i > 0 and j > 0:
+        path.append((i - 1, j - 1))
+        step = np.argmin([D[i - 1, j], D[i, j - 1], D[i - 1, j - 1]])
+        if step == 0:
+            i -= 1
+        elif step == 1:
+            j -= 1
+        else:
+            i -= 1
+            j -= 1
+    return np.array(path[::-1])
+
+
+TemporalScore = namedtuple('TemporalScore', ['reference_frame', 'bone_scores', 'colors', 'score', 'window_score'])
+
+
+class TemporalScorer:
+    """实时打分
+
+    push 用户当前姿势（已旋转到参考坐标系下的单位骨骼向量），score 在参考节目 position 帧附近
+    [position - max_lag - window + 1, position + max_lead] 的窗口中寻找与用户最近 window 帧最匹配的一段
+    （用户最多落后 max_lag 帧、领先 max_lead 帧）：
+        reference_frame  与用户当前这一帧对齐的参考帧
+        bone_scores      当前帧每根骨骼的得分
+        colors           对应的骨骼颜色（QRgb），可直接交给 Player.set_bone_color
+        score            bone_scores 的平均值（瞬时得分）
+        window_score     1 - 匹配路径总代价 / 窗口帧数
+    detected 为参考节目每一帧是否检测到了人体，没检测到的帧（关键点沿用上一帧）代价为无穷大，不参与匹配；
+    整个窗口都没检测到时返回 None
+    end_repetition 结束一遍节目，返回这一遍的平均瞬时得分
+    """
+
+    def __init__(self, window=30, max_lag=30, max_lead=5, curve=None):
+        self.buffer = PoseBuffer(window)
+        self.curve = curve or DEFAULT_CURVE  # 余弦值 -> 得分、颜色的查找表
+        self.max_lag = max_lag
+        self.max_lead = max_lead
+        self.repetition_scores = []
+        self._score_sum = 0.
+        self._score_count = 0
+
+    def reset(self):
+        self.buffer.clear()
+        self._score_sum = 0.
+        self._score_count = 0
+
+    def push(self, bone_arrays):
+        self.buffer.append(bone_arrays)
+
+    def align_and_score(self, bone_arrays, reference, position, detected=None):
+        """摄像头姿势先整体旋转到参考节目 position 帧的坐标系，再 push 并打分"""
+        with instrumentation.span('alignment'):
+            M = align_rotation(bone_arrays, reference[position])
+            self.push(np.dot(bone_arrays, M.T))  # 行向量右乘 R^T 即 R @ v
+        with instrumentation.span('scoring'):
+            return self.score(reference, position, detected)
+
+    def score(self, reference, position, detected=None):
+        if not len(self.buffer) or not len(reference):
+            return None
+        start = max(position - self.max_lag - self.buffer.capacity + 1, 0)
+        end = min(position + self.max_lead + 1, len(reference))
+        user = self.buffer.latest()
+        window = reference[start:end]
+        costs = frame_costs(user, window)
+        if detected is not None:
+            costs[:, ~np.asarray(detected[start:end], dtype=bool)] = np.inf
+        D = dtw(costs, subsequence=True)
+        normalized = D[-1, 1:] / len(user)
+        j = int(np.argmin(normalized))
+        if not np.isfinite(normalized[j]):
+            return None
+        scores, colors, score = self.curve.score_pose(user[-1], window[j])
+        self._score_sum += score
+        self._score_count += 1
+        return TemporalScore(start + j, scores, colors, score, max(1. - float(normalized[j]), 0.))
+
+    def end_repetition(self):
+        """本遍没有打过分时返回 None"""
+        if not self._score_count:
+            return None
+        score = self._score_sum / self._score_count
+        self.repetition_scores.append(score)
+        self._score_sum = 0.
+        self._score_count = 0
+        return score
+
+
+AttemptScore = namedtuple('AttemptScore', ['score', 'frame_scores', 'repetition_scores', 'path'])
+
+
+def score_attempt(user, reference, repetitions=1, band=None, align=True, curve=None):
+    """离线给一整段录制打分
+
+    user (n, 35, 3)、reference (m, 35, 3) 为单位骨骼向量，用户连续做了 repetitions 遍参考节目。
+    align 时先用一个整体旋转把用户对齐到参考坐标系（按时长比例对应的帧估计）。
+    band 默认取参考节目总长的 10%。
+    返回：总分、每个用户帧的得分 (n,)、每一遍的得分 (repetitions,)、匹配路径
+    """
+    user = np.asarray(user, dtype=float)
+    reference = np.tile(np.asarray(reference, dtype=float), (repetitions, 1, 1))
+    if align:
+        proportional = reference[np.linspace(0, len(reference) - 1, len(user)).round().astype(int)]
+        R = align_rotation(user.reshape(-1, 3), proportional.reshape(-1, 3))
+        user = np.dot(user, R.T)
+    if band is None:
+        band = max(len(reference) // 10, 1)
+    D = dtw(frame_costs(user, reference), band=band)
+    if not np.isfinite(D[-1, -1]):
+        raise ValueError(f'band={band} is too narrow for {len(user)} and {len(reference)} frames')
+    path = warping_path(D)
+
+    # 每个用户帧可能对应多个参考帧，取得分最高的一个
+    curve = curve or DEFAULT_CURVE
+    per_pair = np.mean(curve.score(np.sum(user[path[:, 0]] * reference[path[:, 1]], axis=-1)), axis=-1)
+    frame_scores = np.zeros(len(user))
+    np.maximum.at(frame_scores, path[:, 0], per_pair)
+    # 用户帧属于哪一遍，按它对应的第一个参考帧决定
+    first = np.full(len(user), len(reference))
+    np.minimum.at(first, path[:, 0], path[:, 1])
+    repetition = first * repetitions // len(reference)
+    repetition_scores = np.array([frame_scores[repetition == r].mean() if np.any(repetition == r) else 0.
+                                  for r in range(repetitions)])
+    return AttemptScore(float(frame_scores.mean()), frame_scores, repetition_scores, path)
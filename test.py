@@ -5,38 +5,20 @@ from PyQt5.QtWidgets import QApplication, QLabel, QMainWindow, QVBoxLayout, QWid
 from PyQt5.QtGui import QPixmap, QImage
 from PyQt5.QtCore import Qt, QPoint
 
+import quaternion
 from plot_utils import draw_skeleton, pil_image_to_qpixmap
+from gl_skeleton import GLSkeletonView
 
 
-def quaternion_from_axis_angle(axis, angle):
-    half_angle = angle / 2
-    sin_half_angle = np.sin(half_angle)
-    return np.array([np.cos(half_angle)] + [sin_half_angle * a for a in axis])
-
-
-def quaternion_multiply(q1, q2):
-    w1, x1, y1, z1 = q1
-    w2, x2, y2, z2 = q2
-    return np.array([
-        w1 * w2 - x1 * x2 - y1 * y2 - z1 * z2,
-        w1 * x2 + x1 * w2 + y1 * z2 - z1 * y2,
-        w1 * y2 + y1 * w2 + z1 * x2 - x1 * z2,
-        w1 * z2 + z1 * w2 + x1 * y2 - y1 * x2,
-    ])
-
-
-def quaternion_conjugate(q):
-    return np.array([q[0], -q[1], -q[2], -q[3]])
-
-
-def quaternion_rotate_vector(q, v):
-    qv = np.array([0] + v.tolist())
-    q_conj = quaternion_conjugate(q)
-    return quaternion_multiply(quaternion_multiply(q, qv), q_conj)[1:]
+# 四元数运算已移到 quaternion.py，保留旧名字
+quaternion_from_axis_angle = quaternion.from_axis_angle
+quaternion_multiply = quaternion.multiply
+quaternion_conjugate = quaternion.conjugate
+quaternion_rotate_vector = quaternion.rotate_vector
 
 
 class SkeletonViewer(QWidget):
-    def __init__(self, keypoints, parent=None):
+    def __init__(self, keypoints, parent=None, use_opengl=False):
         super(SkeletonViewer, self).__init__(parent)
         self.keypoints = keypoints
 
@@ -44,14 +26,38 @@ class SkeletonViewer(QWidget):
         self.last_mouse_pos = None
 
         self.image_label = QLabel(self)
+        self.gl_view = None
         layout = QVBoxLayout()
-        layout.addWidget(self.image_label)
+        if use_opengl:
+            self.gl_view = GLSkeletonView(self, background=(0, 0, 0, 255))
+            self.gl_view.setFixedSize(512, 512)
+            self.gl_view.set_pose(keypoints)
+            self.gl_view.failed.connect(self.disable_opengl)
+            layout.addWidget(self.gl_view)
+            self.image_label.hide()
+        else:
+            layout.addWidget(self.image_label)
         self.setLayout(layout)
 
         self.update_image()
 
+    def disable_opengl(self, reason: str = ''):
+        """没有可用的 OpenGL 时和 Player 一样退回 PIL 绘制"""
+        if self.gl_view is None:
+            return
+        self.setWindowTitle(f'OpenGL 不可用，改用 CPU 绘制：{reason}')
+        self.layout().replaceWidget(self.gl_view, self.image_label)
+        self.gl_view.hide()
+        self.gl_view.deleteLater()
+        self.gl_view = None
+        self.image_label.show()
+        self.update_image()
+
     def update_image(self):
         normal_vector = quaternion_rotate_vector(self.rotation_quaternion, np.array([0, 0, 1]))
+        if self.gl_view is not None:
+            self.gl_view.set_view(normal_vector)
+            return
         image = draw_skeleton(self.keypoints, normal_vector)
         pixmap = pil_image_to_qpixmap(image)
         self.image_label.setPixmap(pixmap)
@@ -88,7 +94,7 @@ if __name__ == '__main__':
     connections = []  # 这里没有连接线
 
     main_window = QMainWindow()
-    viewer = SkeletonViewer(keypoints)
+    viewer = SkeletonViewer(keypoints, use_opengl='--opengl' in sys.argv)
     main_window.setCentralWidget(viewer)
     main_window.show()
 